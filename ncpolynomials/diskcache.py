@@ -0,0 +1,233 @@
+"""
+On-disk cache of monomial bases and moment matrices
+
+Entries are content addressed: the key is a hash of the operators, the
+substitution rules fingerprint, the degree and the format version, so a
+change to any of them simply misses the cache. Each entry is a directory of
+NumPy .npy arrays and a meta.json file. DiskCache.load can memory-map the
+arrays; the cached bases and moment matrices are read into lists.
+Requires numpy.
+"""
+import errno
+import json
+import os
+import shutil
+import tempfile
+from hashlib import sha1
+
+import numpy as np
+
+from . import polynomials as poly
+from . import rewriting
+from . import simplification_utils as su
+from .relaxation import MomentMatrix
+
+FORMAT_VERSION = 1
+
+
+def _operator_key(op):
+    return [op.name, op.hermitian, op.adjoint]
+
+def _words_key(words):
+    return [[_operator_key(op) for op in map(poly.Operator.from_id, word)] for word in words]
+
+def encode_words(words):
+    """
+    Encodes a list of words as (alphabet, letters, offsets): letters is the
+    concatenation of the words as indices into the alphabet of operator keys
+    and word k is letters[offsets[k] : offsets[k + 1]].
+    """
+    alphabet = []
+    positions = {}
+    letters = []
+    offsets = [0]
+    for word in words:
+        for i in word:
+            position = positions.get(i)
+            if position is None:
+                position = positions[i] = len(alphabet)
+                alphabet.append(_operator_key(poly.Operator.from_id(i)))
+            letters.append(position)
+        offsets.append(len(letters))
+    return alphabet, np.array(letters, dtype = np.int32), np.array(offsets, dtype = np.int64)
+
+def decode_words(alphabet, letters, offsets):
+    """
+    Inverse of encode_words, interning the operators of the alphabet
+    """
+    ids = np.array([poly.Operator(*key).id for key in alphabet] + [0], dtype = np.int64)
+    letters = ids[np.asarray(letters)].tolist()
+    offsets = np.asarray(offsets).tolist()
+    return [tuple(letters[offsets[k] : offsets[k + 1]]) for k in range(len(offsets) - 1)]
+
+
+class DiskCache(object):
+    """
+    DiskCache Class
+
+    Description:
+                    Persistent, content addressed cache of monomial bases
+                    (from get_all_unique_monomials) and moment matrix index
+                    tables (MomentMatrix). Entries are written to a temporary
+                    directory and renamed into place, and are never replaced
+                    once stored, so that concurrent runs never see partial
+                    entries. When two runs store the same key the first one
+                    wins and the other discards its copy.
+
+    Attributes:
+                path        directory holding the entries
+    """
+
+    # Class constructor
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok = True)
+
+    def _key(self, kind, *parts):
+        content = json.dumps([FORMAT_VERSION, kind] + list(parts))
+        return sha1(content.encode()).hexdigest()
+
+    def basis_key(self, base_monomials, degree, subs, extra_monomials = []):
+        subs = rewriting.compile_rules(subs)
+        return self._key('basis', _words_key([mono.word for mono in base_monomials]), degree,
+                         subs.fingerprint, _words_key([mono.word for mono in extra_monomials]))
+
+    def moment_key(self, basis, subs, adjoint = False):
+        subs = rewriting.compile_rules(subs)
+        return self._key('moments', _words_key([mono.word for mono in basis]),
+                         [repr(mono.coef) for mono in basis], subs.fingerprint, adjoint)
+
+    def __contains__(self, key):
+        return self._meta(key) is not None
+
+    def _meta(self, key):
+        try:
+            with open(os.path.join(self.path, key, 'meta.json')) as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if meta.get('version') != FORMAT_VERSION:
+            return None
+        return meta
+
+    def save(self, key, arrays, meta = {}):
+        """
+        Stores a dict of arrays and a dict of JSON metadata under key, unless
+        there is already an entry under key
+        """
+        meta = dict(meta, version = FORMAT_VERSION, arrays = sorted(arrays))
+        tmp = tempfile.mkdtemp(dir = self.path)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, name + '.npy'), np.asarray(array))
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            target = os.path.join(self.path, key)
+            try:
+                os.rename(tmp, target)
+            except OSError as e:
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    raise
+                if self._meta(key) is None:
+                    # A broken entry (e.g. left by a crashed run before the
+                    # renaming) is moved aside first
+                    broken = tempfile.mkdtemp(dir = self.path)
+                    os.rename(target, os.path.join(broken, key))
+                    shutil.rmtree(broken, ignore_errors = True)
+                    os.rename(tmp, target)
+                else:
+                    # Another run stored the same entry first, keep it
+                    shutil.rmtree(tmp, ignore_errors = True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors = True)
+            raise
+
+    def load(self, key, mmap = True):
+        """
+        Returns the (arrays, meta) stored under key, memory-mapping the arrays
+        unless mmap is False, or None if there is no valid entry
+        """
+        meta = self._meta(key)
+        if meta is None:
+            return None
+        arrays = {}
+        for name in meta['arrays']:
+            arrays[name] = np.load(os.path.join(self.path, key, name + '.npy'),
+                                   mmap_mode = 'r' if mmap else None)
+        return arrays, meta
+
+    def invalidate(self, key = None):
+        """
+        Removes the entry stored under key, or every entry if no key is given
+        """
+        keys = [key] if key is not None else os.listdir(self.path)
+        for key in keys:
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors = True)
+
+    def get_all_unique_monomials(self, base_monomials, degree = 1, subs = {}, extra_monomials = []):
+        """
+        Cached version of simplification_utils.get_all_unique_monomials
+        """
+        subs = rewriting.compile_rules(subs)
+        key = self.basis_key(base_monomials, degree, subs, extra_monomials)
+        entry = self.load(key, mmap = False)
+        if entry is not None:
+            arrays, meta = entry
+            words = decode_words(meta['alphabet'], arrays['letters'], arrays['offsets'])
+            return [poly.Monomial._from_word(word, coef) for word, coef in zip(words, arrays['coefs'].tolist())]
+
+        basis = su.get_all_unique_monomials(base_monomials, degree, subs, extra_monomials)
+        alphabet, letters, offsets = encode_words([mono.word for mono in basis])
+        self.save(key, {'letters' : letters, 'offsets' : offsets,
+                        'coefs' : np.array([mono.coef for mono in basis])},
+                  {'alphabet' : alphabet})
+        return basis
+
+    def moment_matrix(self, basis, subs = {}, adjoint = False):
+        """
+        Cached construction of the MomentMatrix of basis
+        """
+        subs = rewriting.compile_rules(subs)
+        key = self.moment_key(basis, subs, adjoint)
+        entry = self.load(key, mmap = False)
+        if entry is not None:
+            arrays, meta = entry
+            index_words = decode_words(meta['alphabet'], arrays['index_letters'], arrays['index_offsets'])
+            mm = MomentMatrix.__new__(MomentMatrix)
+            mm.basis = list(basis)
+            mm.subs = subs
+            mm.adjoint = adjoint
+            mm.moments = index_words[:meta['n_moments']]
+            mm.real = arrays['real'].tolist()
+            mm._moment_index = dict(zip(index_words, zip(arrays['index_ids'].tolist(),
+                                                         arrays['index_conj'].tolist(),
+                                                         arrays['index_scales'].tolist())))
+            mm.rows = arrays['rows'].tolist()
+            mm.cols = arrays['cols'].tolist()
+            mm.moment_ids = arrays['moment_ids'].tolist()
+            mm.coefs = arrays['coefs'].tolist()
+            mm.conj = arrays['conj'].tolist()
+            mm.blocks = None
+            mm.table = None
+            mm.word_ids = None
+            return mm
+
+        mm = MomentMatrix(basis, subs, adjoint)
+        # Moments first so that they can be sliced off the index words
+        moments = set(mm.moments)
+        index_words = mm.moments + [word for word in mm._moment_index if word not in moments]
+        index = [mm._moment_index[word] for word in index_words]
+        alphabet, letters, offsets = encode_words(index_words)
+        self.save(key, {'index_letters' : letters,
+                        'index_offsets' : offsets,
+                        'index_ids' : np.array([value[0] for value in index], dtype = np.int64),
+                        'index_conj' : np.array([value[1] for value in index], dtype = bool),
+                        'index_scales' : np.array([value[2] for value in index]),
+                        'real' : np.array(mm.real, dtype = bool),
+                        'rows' : np.array(mm.rows, dtype = np.int64),
+                        'cols' : np.array(mm.cols, dtype = np.int64),
+                        'moment_ids' : np.array(mm.moment_ids, dtype = np.int64),
+                        'coefs' : np.array(mm.coefs),
+                        'conj' : np.array(mm.conj, dtype = bool)},
+                  {'alphabet' : alphabet, 'n_moments' : mm.n_moments})
+        return mm
@@ -0,0 +1,210 @@
+"""
+Numeric evaluation of polynomials on matrix representations of the operators
+
+Given a matrix for every operator, the expectation values of polynomials are
+computed for a whole batch of states or density matrices at once. Requires
+numpy.
+
+    evaluator = Evaluator({A00 : P0, B00 : Q0, ...})
+    values = evaluator.expectation(chsh, states = psis)
+
+MomentForms instead evaluates polynomials on the moments of a solved
+relaxation, as one sparse product:
+
+    forms = moment_matrix.compile_polynomials(quantities)
+    values = forms.evaluate(y)
+"""
+import numpy as np
+
+from . import instrumentation
+from . import polynomials as poly
+
+
+def _operator(key):
+    # Operators may be given as degree 1 monomials, as generate_operators returns
+    if isinstance(key, poly.Monomial):
+        if len(key.word) != 1 or key.coef != 1:
+            raise ValueError('Matrices should be given for single operators, got {}'.format(key))
+        return poly.Operator.from_id(key.word[0])
+    if isinstance(key, poly.Operator):
+        return key
+    raise TypeError('Matrices should be keyed by Operators or degree 1 Monomials')
+
+
+class Evaluator(object):
+    """
+    Evaluator Class
+
+    Description:
+                    Evaluates polynomials on explicit matrices for the
+                    operators. The matrices may be stacked along leading axes,
+                    e.g. (n_strategies, d, d), and then broadcast against the
+                    batch of states. The matrix of the adjoint of a non-Hermitian
+                    operator defaults to the conjugate transpose.
+
+                    The words of the polynomials are put in a trie over their
+                    reversed letters so that the products W psi (or W rho) of
+                    words sharing a suffix share their matrix products. The
+                    trie is walked depth first, holding one product per level.
+
+    Attributes:
+                matrices    dict mapping operator ids to arrays
+    """
+
+    # Class constructor
+    def __init__(self, matrices):
+        self.matrices = {}
+        for key, matrix in matrices.items():
+            op = _operator(key)
+            matrix = np.asarray(matrix)
+            self.matrices[op.id] = matrix
+            if not op.hermitian:
+                self.matrices.setdefault(op.adj().id, np.conj(np.swapaxes(matrix, -1, -2)))
+
+    def _matrix(self, i):
+        matrix = self.matrices.get(i)
+        if matrix is None:
+            op = poly.Operator.from_id(i)
+            matrix = self.matrices.get(op.simplify().id)
+            if matrix is None:
+                raise ValueError('No matrix given for operator {}'.format(op))
+        return matrix
+
+    def products(self, words, x):
+        """
+        Returns a dict mapping each word to the product of its matrices with
+        x, an array of shape (..., d, k)
+        """
+        trie = {}
+        for word in words:
+            node = trie
+            for letter in reversed(word):
+                node = node.setdefault(letter, {})
+
+        wanted = set(words)
+        values = {}
+        if () in wanted:
+            values[()] = x
+        # Depth first over the reversed words, with the suffix read so far
+        stack = [(letter, child, (), x) for letter, child in trie.items()]
+        matmuls = 0
+        while stack:
+            letter, node, suffix, v = stack.pop()
+            suffix = (letter,) + suffix
+            v = np.matmul(self._matrix(letter), v)
+            matmuls += 1
+            if suffix in wanted:
+                values[suffix] = v
+            for letter, child in node.items():
+                stack.append((letter, child, suffix, v))
+        if instrumentation.stats is not None:
+            instrumentation.stats.count('evaluation matmuls', matmuls)
+        return values
+
+    def expectation(self, polynomials, states = None, rho = None):
+        """
+        Returns the expectation values of a polynomial, or of a list of
+        polynomials, for a batch of states (shape (..., d)) or of density
+        matrices (shape (..., d, d)). The result has the batch shape, with a
+        leading axis over the polynomials if a list was given. Values are
+        complex, the imaginary parts vanishing for Hermitian polynomials.
+        """
+        if (states is None) == (rho is None):
+            raise ValueError('Give either states or density matrices')
+        single = not isinstance(polynomials, (list, tuple))
+        if single:
+            polynomials = [polynomials]
+        polynomials = [poly.Polynomial(p) for p in polynomials]
+
+        with instrumentation.stage('Evaluator.expectation'):
+            words = set(term.word for p in polynomials for term in p.terms)
+            if states is not None:
+                states = np.asarray(states)
+                values = self.products(words, states[..., None])
+                conj = np.conj(states)
+                values = dict((word, np.einsum('...i,...i->...', conj, v[..., 0]))
+                              for word, v in values.items())
+            else:
+                values = self.products(words, np.asarray(rho))
+                values = dict((word, np.trace(v, axis1 = -2, axis2 = -1))
+                              for word, v in values.items())
+
+            results = []
+            for p in polynomials:
+                value = 0j
+                for term in p.terms:
+                    value = value + term.coef * values[term.word]
+                results.append(value)
+            results = np.broadcast_arrays(*results)
+        if single:
+            return results[0]
+        return np.stack(results)
+
+
+def expectation(polynomial, matrices, states = None, rho = None):
+    """
+    Returns the expectation value of polynomial with the operators replaced
+    by matrices (a dict keyed by operator), see Evaluator.expectation
+    """
+    return Evaluator(matrices).expectation(polynomial, states, rho)
+
+
+class MomentForms(object):
+    """
+    MomentForms Class
+
+    Description:
+                    Expectation values of a batch of polynomials as linear
+                    forms of the moments of a MomentMatrix, stored as the
+                    scipy.sparse (n_polynomials, n_moments) matrices A and B
+                    with values = A y + B conj(y). The polynomials are reduced
+                    with the substitution rules of the moment matrix, each
+                    distinct word once for the whole batch, and the forms can
+                    be evaluated on any number of solutions.
+
+    Attributes:
+                moment_matrix   the MomentMatrix
+                A               csr matrix of the coefficients of the moments
+                B               csr matrix of the coefficients of their
+                                conjugates
+    """
+
+    # Class constructor
+    def __init__(self, moment_matrix, polynomials):
+        from scipy import sparse
+
+        self.moment_matrix = moment_matrix
+        polynomials = list(polynomials)
+        rows = [([], [], []), ([], [], [])]
+        with instrumentation.stage('MomentForms compile'):
+            found = {}
+            for i, p in enumerate(polynomials):
+                form = moment_matrix._linear_form(poly.Polynomial(p), found)
+                for (k, conj), coef in form.items():
+                    # Conjugation does nothing to real moments
+                    values, row, col = rows[conj and not moment_matrix.real[k]]
+                    values.append(complex(coef))
+                    row.append(i)
+                    col.append(k)
+            shape = (len(polynomials), moment_matrix.n_moments)
+            self.A, self.B = [sparse.coo_matrix((np.array(values, dtype = complex), (row, col)), shape = shape).tocsr()
+                              for values, row, col in rows]
+
+    def __len__(self):
+        return self.A.shape[0]
+
+    def evaluate(self, y):
+        """
+        Returns the array of the expectation values of the polynomials given
+        the moments y: a picos expression from MomentMatrix.to_picos after
+        solving, a cvxopt matrix or an array, of shape (n_moments,) or
+        (n_moments, n_solutions). Values are complex, the imaginary parts
+        vanishing for Hermitian polynomials.
+        """
+        y = getattr(y, 'value', y)
+        y = np.asarray(y)
+        if y.ndim == 2 and y.shape[1] == 1:
+            y = y[:, 0]
+        if y.shape[0] != self.A.shape[1]:
+            raise ValueError('Expected {} moments, got {}'.format(self.A.shape[1], y.shape[0]))
+        return self.A.dot(y) + self.B.dot(np.conj(y))
@@ -0,0 +1,152 @@
+"""
+Exporting relaxations to files for standalone solvers
+
+write_sdpa streams a MomentMatrix (and localizing constraints) to a sparse
+SDPA .dat-s file entry by entry, without building any solver expression.
+save_npz dumps the moment matrix as the SciPy sparse matrices of its linear
+map, Gamma = A y + B conj(y), for use outside of this package.
+"""
+from itertools import groupby
+
+from . import instrumentation
+from . import relaxation
+
+
+def _variables(mm, matrices, real):
+    # Real variables (moment id, imaginary part flag) that appear in the
+    # matrices, moment 0 being the constant 1 (variable 0)
+    used = set()
+    for n, entries in matrices:
+        for i, j, k, c, conj in entries():
+            if k == 0:
+                continue
+            used.add((k, False))
+            if not real and i != j and not mm.real[k]:
+                used.add((k, True))
+    index = dict((key, index + 1) for index, key in enumerate(sorted(used)))
+    index[(0, False)] = 0
+    return index
+
+def _upper(n, entries, index, real):
+    """
+    Yields the (row, col, variable, value) entries of the upper triangle of
+    the real symmetric matrix of the entries (embedded as [[Re, -Im],
+    [Im, Re]] unless real), merging the moments of each entry
+    """
+    for (i, j), group in groupby(entries, key = lambda entry: entry[:2]):
+        values = {}
+        for _, _, k, c, conj in group:
+            re, im = relaxation._real_parts(index, k, conj, c)
+            if real:
+                if complex(c).imag != 0:
+                    raise ValueError('Real relaxations need real moment matrix coefficients')
+                positions = [((i, j), re, 1)]
+            else:
+                positions = [((i, j), re, 1), ((i + n, j + n), re, 1)]
+                if i != j:
+                    # Im at (i + n, j) and -Im at (i, j + n), in the upper
+                    # triangle
+                    positions += [((j, i + n), im, 1), ((i, j + n), im, -1)]
+            for position, terms, sign in positions:
+                for var, value in terms:
+                    key = position + (var,)
+                    values[key] = values.get(key, 0) + sign * value
+        for (row, col, var), value in values.items():
+            if value != 0:
+                yield row, col, var, value
+
+
+def write_sdpa(moment_matrix, filename, objective, direction = 'max', constraints = [], real = False):
+    """
+    Writes the relaxation optimizing the expectation of objective over the
+    moment matrix (block by block if it is block structured) and the
+    localizing matrices of the constraints to filename, or to a file object,
+    in the sparse SDPA format.
+
+    The variables are the real and imaginary parts of the moments that
+    appear, moment 0 being substituted by 1. Complex Hermitian matrices are
+    embedded as real symmetric ones. SDPA minimizes, so for maximizations
+    the objective is negated; the objective constant and the variables are
+    listed in the comment lines. Returns the list of (moment id, imaginary
+    part flag) of the variables.
+    """
+    mm = moment_matrix
+    with instrumentation.stage('write_sdpa'):
+        # Localizing matrices first as they may add moments
+        localizing = [L for L in mm.localizing_matrices(constraints) if len(L) > 0]
+        if mm.blocks is None:
+            matrices = [(len(mm), mm.entries)]
+        else:
+            matrices = [(len(block), lambda b = b: mm.block_entries(b)) for b, block in enumerate(mm.blocks)]
+        matrices += [(len(L), L.entries) for L in localizing]
+        index = _variables(mm, matrices, real)
+
+        sign = 1 if direction == 'min' else -1
+        n_variables = len(index) - 1
+        c = [0.] * (n_variables + 1)
+        for (k, conj), coef in mm.linear_form(objective).items():
+            for var, value in relaxation._real_parts(index, k, conj, coef)[0]:
+                c[var] += sign * value
+
+        f = open(filename, 'w') if isinstance(filename, str) else filename
+        try:
+            f.write('"ncpolynomials relaxation, {} of the objective"\n'.format(direction))
+            f.write('* objective constant {!r}, {} variables\n'.format(sign * c[0], n_variables))
+            f.write('{}\n{}\n'.format(n_variables, len(matrices)))
+            f.write(' '.join(str(n if real else 2 * n) for n, _ in matrices) + '\n')
+            f.write(' '.join(repr(value) for value in c[1:]) + '\n')
+            for block, (n, entries) in enumerate(matrices):
+                for row, col, var, value in _upper(n, entries(), index, real):
+                    # sum_k F_k x_k - F_0 with the constant part in F_0
+                    if var == 0:
+                        value = -value
+                    f.write('{} {} {} {} {!r}\n'.format(var, block + 1, row + 1, col + 1, value))
+        finally:
+            if f is not filename:
+                f.close()
+    return sorted(index, key = index.get)[1:]
+
+
+def sparse_maps(moment_matrix):
+    """
+    Returns the scipy.sparse (n * n, n_moments) matrices A and B with
+    vec(Gamma) = A y + B conj(y), vec stacking the columns of the moment
+    matrix, as in MomentMatrix.to_picos
+    """
+    import numpy as np
+    from scipy import sparse
+
+    mm = moment_matrix
+    n = len(mm)
+    (a_values, a_rows, a_cols), (b_values, b_rows, b_cols) = relaxation._linear_maps(n, mm.entries())
+    shape = (n * n, mm.n_moments)
+    A = sparse.coo_matrix((np.array(a_values, dtype = complex), (a_rows, a_cols)), shape = shape).tocsr()
+    B = sparse.coo_matrix((np.array(b_values, dtype = complex), (b_rows, b_cols)), shape = shape).tocsr()
+    return A, B
+
+def save_npz(moment_matrix, filename):
+    """
+    Saves the maps A and B of sparse_maps, the real flags of the moments and
+    the size of the moment matrix to a .npz file, see load_npz
+    """
+    import numpy as np
+
+    A, B = sparse_maps(moment_matrix)
+    A, B = A.tocoo(), B.tocoo()
+    np.savez_compressed(filename, size = len(moment_matrix), shape = A.shape,
+                        A_data = A.data, A_row = A.row, A_col = A.col,
+                        B_data = B.data, B_row = B.row, B_col = B.col,
+                        real = np.array(moment_matrix.real, dtype = bool))
+
+def load_npz(filename):
+    """
+    Returns the (A, B, real, size) saved by save_npz
+    """
+    import numpy as np
+    from scipy import sparse
+
+    data = np.load(filename)
+    shape = tuple(data['shape'])
+    A = sparse.coo_matrix((data['A_data'], (data['A_row'], data['A_col'])), shape = shape).tocsr()
+    B = sparse.coo_matrix((data['B_data'], (data['B_row'], data['B_col'])), shape = shape).tocsr()
+    return A, B, data['real'], int(data['size'])
@@ -0,0 +1,172 @@
+"""
+Optional instrumentation of the rewriting and relaxation pipeline
+
+Instrumentation is off by default. The hot paths only test whether the
+module attribute stats is None, so nothing is recorded and almost nothing
+is paid until enable is called.
+
+    stats = instrumentation.enable(callback = print)
+    ...
+    stats.as_dict()
+"""
+import time
+import tracemalloc
+
+# The active Stats object, None while instrumentation is disabled
+stats = None
+
+
+class Stats(object):
+    """
+    Stats Class
+
+    Description:
+                    Counters and stage timings collected while instrumentation
+                    is enabled. Callbacks are called as callback(name, record)
+                    every time a stage finishes, record being the dict of
+                    measurements of that single call.
+
+    Attributes:
+                counters        dict of named event counts
+                rule_hits       dict mapping (rule set fingerprint, rule index)
+                                to the number of times the rule was applied
+                rewrite_steps   dict mapping the number of rewrites needed by a
+                                reduction to the number of such reductions
+                max_depth       largest number of rewrites in one reduction
+                stages          dict mapping stage names to their calls, total
+                                wall time and largest peak memory allocated
+                                on top of the memory in use when they started
+                memory          bool, whether peak memory is traced
+                callbacks       list of functions called when a stage finishes
+    """
+
+    # Class constructor
+    def __init__(self, memory = False, callbacks = []):
+        self.memory = memory
+        self.callbacks = list(callbacks)
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.rule_hits = {}
+        self.rewrite_steps = {}
+        self.max_depth = 0
+        self.stages = {}
+        self._peaks = []
+        self._started_tracing = False
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def rule_hit(self, fingerprint, index):
+        key = (fingerprint, index)
+        self.rule_hits[key] = self.rule_hits.get(key, 0) + 1
+
+    def reduction(self, steps):
+        self.rewrite_steps[steps] = self.rewrite_steps.get(steps, 0) + 1
+        if steps > self.max_depth:
+            self.max_depth = steps
+
+    def as_dict(self):
+        """
+        Returns a plain dict snapshot of everything recorded, together with
+        the normal form cache statistics
+        """
+        from .rewriting import normal_form_cache
+        reductions = sum(self.rewrite_steps.values())
+        steps = sum(k * v for k, v in self.rewrite_steps.items())
+        return {'counters' : dict(self.counters),
+                'reductions' : reductions,
+                'rewrite_steps' : steps,
+                'mean_rewrite_steps' : steps / reductions if reductions else 0.,
+                'max_depth' : self.max_depth,
+                'rule_hits' : dict(('{}:{}'.format(*key), n) for key, n in self.rule_hits.items()),
+                'stages' : dict((name, dict(record)) for name, record in self.stages.items()),
+                'normal_form_cache' : normal_form_cache.info()}
+
+
+class _Stage(object):
+    # Context manager timing one call of a stage
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.stats._started_tracing = True
+            # Peaks are tracked per nesting level as the traced memory is
+            # reset when a nested stage starts
+            peaks = self.stats._peaks
+            current, peak = tracemalloc.get_traced_memory()
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            tracemalloc.reset_peak()
+            peaks.append(0)
+            self.baseline = current
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        record = {'time' : elapsed}
+        if self.stats.memory:
+            peaks = self.stats._peaks
+            peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            tracemalloc.reset_peak()
+            record['peak_memory'] = peak - self.baseline
+
+        total = self.stats.stages.setdefault(self.name, {'calls' : 0, 'time' : 0., 'peak_memory' : 0})
+        total['calls'] += 1
+        total['time'] += elapsed
+        total['peak_memory'] = max(total['peak_memory'], record.get('peak_memory', 0))
+        for callback in self.stats.callbacks:
+            callback(self.name, record)
+        return False
+
+
+class _NoStage(object):
+    # Shared do-nothing context manager used while disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_no_stage = _NoStage()
+
+
+def stage(name):
+    """
+    Returns a context manager recording the wall time (and peak memory if
+    enabled) of the enclosed block under name
+    """
+    if stats is None:
+        return _no_stage
+    return _Stage(stats, name)
+
+def enable(callback = None, memory = False):
+    """
+    Enables instrumentation with a fresh Stats object, which is returned.
+    callback, if given, is called as callback(name, record) after every
+    stage. If memory is True the peak memory of the stages is traced with
+    tracemalloc, which slows everything down.
+    """
+    global stats
+    stats = Stats(memory, [callback] if callback is not None else [])
+    return stats
+
+def disable():
+    """
+    Disables instrumentation and returns the Stats object that was active
+    """
+    global stats
+    old, stats = stats, None
+    if old is not None and old._started_tracing:
+        tracemalloc.stop()
+    return old
@@ -0,0 +1,50 @@
+"""
+Reducing large collections of words in a pool of worker processes
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+
+# Rewriting system of a worker process of a pool created by reduce_words
+_worker_system = None
+
+
+def _init_worker(system):
+    global _worker_system
+    _worker_system = system
+
+def _reduce_chunk(words, system = None):
+    # Rewriting systems with no rules have length 0, so test for None
+    reduce = (system if system is not None else _worker_system).reduce
+    return [reduce(word) for word in words]
+
+def chunk(items, n_chunks):
+    """
+    Splits a list into at most n_chunks contiguous chunks of similar length
+    """
+    size = max(1, -(-len(items) // n_chunks))
+    return [items[k : k + size] for k in range(0, len(items), size)]
+
+def reduce_words(system, words, workers = None, n_chunks = None):
+    """
+    Reduces a list of words (tuples of operator ids) with a RewritingSystem
+    and returns the list of (word, scale) pairs in the same order.
+
+    workers is either the number of worker processes to use or an existing
+    concurrent.futures Executor. The words are split into chunks which are
+    reduced in the workers, each worker receiving the rules in their compact
+    pickled form. With no workers the words are reduced in this process.
+    n_chunks is the number of chunks, by default four per worker process or
+    16 for an Executor, whose size is not known.
+    """
+    if not workers or (not isinstance(workers, Executor) and workers <= 1) or len(words) < 2:
+        return [system.reduce(word) for word in words]
+
+    if isinstance(workers, Executor):
+        # The rules are sent along with every chunk
+        chunks = chunk(words, n_chunks or 16)
+        results = workers.map(_reduce_chunk, chunks, repeat(system))
+        return [value for result in results for value in result]
+
+    with ProcessPoolExecutor(workers, initializer = _init_worker, initargs = (system,)) as executor:
+        results = executor.map(_reduce_chunk, chunk(words, n_chunks or 4 * workers))
+        return [value for result in results for value in result]
@@ -7,9 +7,42 @@ Monomials can be summed to form polynomials...
 
 Author: Peter J. Brown (02/12/20)
 """
+from functools import lru_cache
+from hashlib import blake2b
 from itertools import product
-from copy import deepcopy
-from . import simplification_utils as tools
+from . import instrumentation
+from . import parallel
+from . import rewriting
+
+
+def adjoint_word(word):
+    """
+    Returns the word (tuple of operator ids) of the adjoint of a product:
+    reversed with each operator replaced by its adjoint
+    """
+    adjoints = Operator._adjoints
+    return tuple([adjoints[i] for i in reversed(word)])
+
+# Maximum number of word digests kept, see word_digest
+WORD_DIGESTS_MAXSIZE = 100000
+
+@lru_cache(maxsize = WORD_DIGESTS_MAXSIZE)
+def word_digest(word):
+    """
+    Returns a 64 bit digest of a word computed from the names of its
+    operators, so that it does not depend on the process or on the order the
+    operators were created in. The most recently used digests are cached.
+    """
+    key = repr([(op._name, op._adjoint) for op in map(Operator.from_id, word)])
+    return int.from_bytes(blake2b(key.encode(), digest_size = 8).digest(), 'little')
+
+def term_hash(word, coef):
+    """
+    Returns the hash of a single term of a Polynomial. The hash of a
+    Polynomial is the sum of the hashes of its collected terms modulo 2**64,
+    which does not depend on the order of the terms.
+    """
+    return (word_digest(word) * 1000003 + hash(coef)) & 0xffffffffffffffff
 
 
 class Operator(object):
@@ -19,31 +52,63 @@ class Operator(object):
     Description:
                     Object representing an abstract operator in some *-algebra.
 
+                    Operators are immutable and interned: constructing an
+                    operator with the same name, hermiticity and adjoint flag
+                    returns the same object. Each operator is assigned a small
+                    integer id on creation and Monomials store their products
+                    as tuples of these ids.
+
     Attributes:
                 _name        String labelling the operator
                 _hermitian   Bool indicating whether the operator is Hermitian
                 _adjoint     Bool indicating whether the operator is the adjoint
+                _id          Integer id of the operator in the intern table
     """
+    __slots__ = ('_name', '_hermitian', '_adjoint', '_id', '_hash')
+
+    # Intern table shared by all operators
+    _registry = {}
+    _table = []
+    _adjoints = []
 
     # Class constructor
-    def __init__(self, name = 'Id', hermitian = True, adjoint = False):
+    def __new__(cls, name = 'Id', hermitian = True, adjoint = False):
         if isinstance(name, Operator):
-            self._name = str(name.name)
-            self._hermitian = name.hermitian
-            self._adjoint = name.adjoint
-        else:
-            self._name = name
-            self._hermitian = hermitian
-            self._adjoint = adjoint
+            return name
+        if not isinstance(name, str):
+            raise TypeError('Attribute \'name\' should be a string')
+        key = (name, bool(hermitian), bool(adjoint))
+        op = cls._registry.get(key)
+        if op is None:
+            op = object.__new__(cls)
+            op._name, op._hermitian, op._adjoint = key
+            op._id = len(cls._table)
+            op._hash = hash((op._name, op._adjoint))
+            cls._registry[key] = op
+            cls._table.append(op)
+            cls._adjoints.append(op._id)
+            # Non-hermitian operators are registered together with their adjoint
+            if not op._hermitian:
+                partner = cls(name, False, not op._adjoint)
+                cls._adjoints[op._id] = partner._id
+                cls._adjoints[partner._id] = op._id
+        return op
+
+    @classmethod
+    def from_id(cls, id):
+        return cls._table[id]
+
+    def __reduce__(self):
+        # Re-intern on unpickling/copying rather than duplicating the operator
+        return (Operator, (self._name, self._hermitian, self._adjoint))
 
     def __hash__(self):
-        return hash((self.name, self.adjoint))
+        return self._hash
 
     def __eq__(self, other):
-        if (self.name == other.name) and (self.adjoint == other.adjoint):
-            return True
-        else:
-            return False
+        if isinstance(other, Operator):
+            return self is other
+        return NotImplemented
 
     def __mul__(self, other):
         return Monomial(self) * Monomial(other)
@@ -63,16 +128,10 @@ class Operator(object):
         return Monomial([self], -1)
 
 
-    # Getters/Setters
+    # Getters
     @property
     def name(self):
         return self._name
-    @name.setter
-    def name(self, val):
-        if isinstance(val, str):
-            self._name = val
-        else:
-            raise TypeError('Attribute \'name\' should be a string')
 
     @property
     def hermitian(self):
@@ -80,24 +139,19 @@ class Operator(object):
     @property
     def adjoint(self):
         return self._adjoint
-    @adjoint.setter
-    def adjoint(self, val):
-        if isinstance(val, bool):
-            self._adjoint = val
-        else:
-            raise TypeError('Attribute \'adjoint\' should be a boolean value')
+
+    @property
+    def id(self):
+        return self._id
 
 
     def adj(self):
-        X = Operator(self)
-        if X.hermitian == False:
-            X.adjoint = not X.adjoint
-        return X
+        return Operator._table[Operator._adjoints[self._id]]
 
     def simplify(self):
         # If we have taken the adjoint of a hermitian operator then remove it
-        if (self.hermitian == 1) and (self.adjoint == 1):
-            self.adjoint = False
+        if self.hermitian and self.adjoint:
+            return Operator(self.name, True, False)
         return self
 
     def __repr__(self):
@@ -114,51 +168,70 @@ class Monomial(object):
     Description:
                     Object representing a product of operators
 
+                    The product is stored as an immutable tuple of operator
+                    ids (the word) so that copying, concatenation and slicing
+                    are tuple operations. The hash and adjoint of the word are
+                    computed lazily and cached.
+
     Attributes:
-                _terms      list of operators in the product
+                _word       tuple of operator ids in the product
                 _coef       coefficient of the monomial
     """
+    __slots__ = ('_word', '_coef', '_hash', '_adjword')
 
     # Class constructor
     def __init__(self, terms = [], coef = 1):
+        self._hash = None
+        self._adjword = None
         if isinstance(terms, Operator):
-            self.terms = [deepcopy(terms)]
+            self._word = (terms._id,)
             self.coef = 1
         elif isinstance(terms, Monomial):
-            self.terms = deepcopy(terms.terms)
-            self.coef = terms.coef
+            self._word = terms._word
+            self._hash = terms._hash
+            self._adjword = terms._adjword
+            self._coef = terms._coef
         elif isinstance(terms, (int, float, complex)):
-            self.terms = []
+            self._word = ()
             self.coef = terms
         else:
-            self.terms = deepcopy(terms)
+            self.terms = terms
             self.coef = coef
 
+    @classmethod
+    def _from_word(cls, word, coef):
+        # Fast constructor for internal use, skips all validation
+        mono = object.__new__(cls)
+        mono._word = word
+        mono._coef = coef
+        mono._hash = None
+        mono._adjword = None
+        return mono
+
+    def __reduce__(self):
+        # Operator ids are local to a process so pickle the operators instead
+        return (Monomial, (self.terms, self._coef))
+
     def __len__(self):
-        return len(self.terms)
+        return len(self._word)
 
     def __hash__(self):
-        x = tuple(self.terms + [self.coef])
-        return hash(x)
+        if self._hash is None:
+            self._hash = hash(self._word)
+        return hash((self._hash, self._coef))
 
     def __eq__(self, other):
-        equal = True
-        if (len(self) != len(other)) or (self.coef != other.coef):
-            equal = False
-        else:
-            for i in range(len(self.terms)):
-                if (self.terms[i].name != other.terms[i].name) or (self.terms[i].adjoint != other.terms[i].adjoint):
-                    equal = False
-                    break
-        return equal
+        if isinstance(other, (int, float, complex, Operator)):
+            other = Monomial(other)
+        elif not isinstance(other, Monomial):
+            return NotImplemented
+        return (self._word == other._word) and (self._coef == other._coef)
 
     def __mul__(self, other):
         if isinstance(other, (int,float, complex, Operator)):
             return self * Monomial(other)
         elif isinstance(other, Monomial):
-            terms = self.terms + other.terms
-            coef = self.coef * other.coef
-            return Monomial(terms, coef)
+            return Monomial._from_word(self._word + other._word, self._coef * other._coef)
         elif isinstance(other, Polynomial):
             return Polynomial(self) * other
         else:
@@ -179,35 +252,42 @@ class Monomial(object):
         return -(self - other)
 
     def __neg__(self):
-        return Monomial(self.terms, -self.coef)
+        mono = Monomial(self)
+        mono._coef = -self._coef
+        return mono
 
     def __mod__(self, other):
         """
         Overloads the % comparison operator.
         We will use this to define equality ignoring the coefficients
         """
-        equal = True
-        other = Monomial(other)
-        if len(self) != len(other):
-            equal = False
-        else:
-            for i in range(len(self.terms)):
-                if (self.terms[i].name != other.terms[i].name) or (self.terms[i].adjoint != other.terms[i].adjoint):
-                    equal = False
-                    break
-        return equal
+        if not isinstance(other, Monomial):
+            other = Monomial(other)
+        return self._word == other._word
 
     # Getters/Setters
     @property
     def terms(self):
-        return self._terms
+        return [Operator._table[i] for i in self._word]
     @terms.setter
     def terms(self, val):
-        if isinstance(val, list):
-            self._terms = val
+        if isinstance(val, (list, tuple)):
+            try:
+                self._set_word(tuple(op._id for op in val))
+            except AttributeError:
+                raise TypeError('Attribute \'terms\' should be a list of operators')
         else:
             raise TypeError('Attribute \'terms\' should be a list of operators')
 
+    @property
+    def word(self):
+        return self._word
+
+    def _set_word(self, word):
+        self._word = word
+        self._hash = None
+        self._adjword = None
+
     @property
     def coef(self):
         return self._coef
@@ -220,22 +300,25 @@ class Monomial(object):
 
     @property
     def degree(self):
-        return len(self)
+        return len(self._word)
 
     @property
     def hermitian(self):
-        X = self.adj()
-        return self % X
+        return self._word == self.adjword
+
+    @property
+    def adjword(self):
+        if self._adjword is None:
+            self._adjword = adjoint_word(self._word)
+        return self._adjword
 
     def adj(self):
-        X = Monomial(self)
-        # Reverse the order
-        X.terms.reverse()
-        # Apply adjoints to the operators in list in not hermitian
-        X.terms = [op.adj() if op.hermitian == False else op for op in X.terms]
         # If the coefficient is complex then we should conjugate
-        if isinstance(X.coef, complex):
-            X.coef = X.coef.conjugate()
+        coef = self._coef
+        if isinstance(coef, complex):
+            coef = coef.conjugate()
+        X = Monomial._from_word(self.adjword, coef)
+        X._adjword = self._word
         return X
 
     def apply_substitution(self, old, new):
@@ -243,16 +326,19 @@ class Monomial(object):
         Tries to find Monomial old in Monomial self.
         If found replaces with Monomial new
         """
-        old_term = Monomial(old)
-        new_term = Monomial(new)
+        old_term = old if isinstance(old, Monomial) else Monomial(old)
+        new_term = new if isinstance(new, Monomial) else Monomial(new)
+        old_word = old_term._word
+        word = self._word
+        n = len(old_word)
         success = False
-        if len(old_term) <= len(self):
-            for m in range(len(self) - len(old_term) + 1):
-                if Monomial(self.terms[m : m + len(old_term)], 1) % Monomial(old_term.terms, 1):
+        if n <= len(word):
+            for m in range(len(word) - n + 1):
+                if word[m : m + n] == old_word:
                     success = True
-                    left_terms = self.terms[0 : m]
-                    right_terms = self.terms[m + len(old_term) : len(self)]
-                    self.terms = left_terms + new_term.terms + right_terms
+                    if instrumentation.stats is not None:
+                        instrumentation.stats.count('apply_substitution')
+                    self._set_word(word[:m] + new_term._word + word[m + n:])
 
                     # if the coefficient of old_term was not 1 then we should divide through
                     self.coef = self.coef * new_term.coef / old_term.coef
@@ -262,29 +348,25 @@ class Monomial(object):
 
     def simplify(self, subs):
         """
-        Takes a dictionary of substitution rules and applies the substitutions
-        until no more simplifications are found.
+        Takes a dictionary of substitution rules (or a compiled
+        RewritingSystem) and applies the substitutions until no more
+        simplifications are found.
         """
-        success = False
-
-        for old, new in subs.items():
-            success = self.apply_substitution(old, new)
-            # If we do make a sub then we should try the previous subs again
-            # until we don't find one anymore
-            if success == True:
-                self.simplify(subs)
-                break
+        word, coef = rewriting.compile_rules(subs).reduce(self._word, self._coef)
+        if word != self._word:
+            self._set_word(word)
+        self._coef = coef
 
         # If the coefficient is 0 then remove the terms
         if self.coef == 0:
-            self.terms = []
+            self._set_word(())
         return Monomial(self)
 
 
 
     def __repr__(self):
         string = ''
-        if len(self.terms) > 0:
+        if len(self._word) > 0:
             for term in self.terms:
                 string += term.__repr__()
         else:
@@ -299,6 +381,10 @@ class Polynomial(object):
     Description:
                     Object representing sums of monomials
 
+                    Equality and hashing do not depend on the order of the
+                    terms: like terms are collected and zero terms dropped
+                    before comparing, see canonical.
+
     Attributes:
                 _terms      list of monomials in the sum
     """
@@ -308,34 +394,83 @@ class Polynomial(object):
         if isinstance(terms, (int, float, complex, Operator, Monomial)):
             self.terms = [Monomial(terms)]
         elif isinstance(terms, Polynomial):
-            self.terms = deepcopy(terms.terms)
+            self.terms = [Monomial(term) for term in terms.terms]
         else:
-            self.terms = deepcopy(terms)
+            self.terms = [Monomial(term) for term in terms]
+
+    @classmethod
+    def _from_terms(cls, terms):
+        # Fast constructor for internal use, takes ownership of the list
+        polynomial = cls.__new__(cls)
+        polynomial._terms = terms
+        return polynomial
+
+    @classmethod
+    def from_words(cls, words, coefs, collect = True):
+        """
+        Builds a polynomial from aligned sequences of words and coefficients
+        (e.g. NumPy arrays), allocating each term once. A word is a sequence
+        of operator ids (e.g. a row of an integer array), Operators or
+        degree 1 Monomials. If collect is True like terms are summed and
+        zero terms dropped.
+        """
+        terms = {} if collect else []
+        for word, coef in zip(words, coefs):
+            word = _letters(word)
+            coef = coef.item() if hasattr(coef, 'item') else coef
+            if collect:
+                terms[word] = terms.get(word, 0) + coef
+            else:
+                terms.append(Monomial._from_word(word, coef))
+        if collect:
+            terms = [Monomial._from_word(word, coef) for word, coef in terms.items() if coef != 0]
+        return cls._from_terms(terms)
+
+    def add_terms(self, other):
+        """
+        Adds the terms of other (a polynomial, monomial, operator or number)
+        to this polynomial in place, copying only the terms of other, and
+        returns it
+        """
+        if isinstance(other, (int, float, complex, Operator, Monomial, Polynomial)):
+            self.terms.extend(Polynomial(other).terms)
+            return self
+        raise TypeError('Bad type for addition with Polynomial')
 
     def __len__(self):
         return len(self.terms)
 
     def __hash__(self):
-        x = tuple(self.terms)
-        return hash(x)
+        return PolynomialHash(self).value()
 
     def __eq__(self, other):
-        equal = True
-        other = Polynomial(other)
-        if (len(self) != len(other)):
-            equal = False
-        else:
-            for i in range(len(self.terms)):
-                if Monomial(self.terms[i]) != Monomial(other.terms[i]):
-                    equal = False
-                    break
-        return equal
+        if isinstance(other, (int, float, complex, Operator, Monomial)):
+            other = Polynomial(other)
+        elif not isinstance(other, Polynomial):
+            return NotImplemented
+        return self._collect() == other._collect()
+
+    def _collect(self):
+        # Dict mapping words to their summed nonzero coefficients
+        coefs = {}
+        for term in self.terms:
+            coefs[term.word] = coefs.get(term.word, 0) + term.coef
+        return dict((word, coef) for word, coef in coefs.items() if coef != 0)
+
+    def canonical(self):
+        """
+        Returns the canonical form of the polynomial: like terms collected,
+        zero terms dropped and the terms sorted by degree and then by word
+        """
+        coefs = self._collect()
+        return Polynomial._from_terms([Monomial._from_word(word, coefs[word])
+                                       for word in sorted(coefs, key = lambda word: (len(word), word))])
 
     def __add__(self, other):
         if isinstance(other, (int, float, complex, Operator, Monomial)):
             return self + Polynomial(other)
         elif isinstance(other, Polynomial):
-            return Polynomial(self.terms + other.terms)
+            return Polynomial._from_terms([Monomial(term) for term in self.terms + other.terms])
         else:
             raise TypeError('Bad type for addition with Polynomial')
     def __radd__(self, other):
@@ -351,9 +486,31 @@ class Polynomial(object):
             return self * Polynomial(other)
         elif isinstance(other, Polynomial):
             newterms = [term1 * term2 for term1, term2 in product(self.terms, other.terms)]
-            return Polynomial(newterms)
+            return Polynomial._from_terms(newterms)
         else:
             raise TypeError('Bad type for multiplication with Polynomial')
+    def multiply(self, other, subs = {}, max_degree = None):
+        """
+        Returns the simplified product of self and other. Each product of
+        terms is reduced with the substitutions subs as soon as it is formed
+        and its coefficient accumulated straight into the result, so the
+        unreduced product is never built. Terms whose reduced degree exceeds
+        max_degree are dropped.
+        """
+        if not isinstance(other, Polynomial):
+            other = Polynomial(other)
+        reduce = rewriting.compile_rules(subs).reduce
+        right = [(term.word, term.coef) for term in other.terms]
+        coefs = {}
+        for term in self.terms:
+            left, left_coef = term.word, term.coef
+            for word, coef in right:
+                word, coef = reduce(left + word, left_coef * coef)
+                if coef == 0 or (max_degree is not None and len(word) > max_degree):
+                    continue
+                coefs[word] = coefs.get(word, 0) + coef
+        return Polynomial._from_terms([Monomial._from_word(word, coef) for word, coef in coefs.items() if coef != 0])
+
     def __rmul__(self, other):
         # If multiplication is with number then it is reflexive
         if isinstance(other, (int,float,complex)):
@@ -364,7 +521,7 @@ class Polynomial(object):
             return (1/other) * self
 
     def __neg__(self):
-        return Polynomial([-term for term in self.terms])
+        return Polynomial._from_terms([-term for term in self.terms])
 
     # Getters/Setters
     @property
@@ -382,21 +539,43 @@ class Polynomial(object):
         return max([len(term) for term in self.terms])
 
     def adj(self):
-        return Polynomial([term.adj() for term in self.terms])
+        return Polynomial._from_terms([term.adj() for term in self.terms])
 
-    def simplify(self, subs):
+    def simplify(self, subs, workers = None):
         """
         Simplifies a polynomial using the substitutions subs
+
+        If workers is given (a number of processes or an Executor) the terms
+        are reduced in parallel and the like terms collected afterwards.
         """
-        success = False
-        # First simplify each term in the poly individually
-        self.terms = [term.simplify(subs) for term in self.terms[:]]
+        with instrumentation.stage('Polynomial.simplify'):
+            return self._simplify(subs, workers)
+
+    def _simplify(self, subs, workers):
+        # Compile the rules once for all of the terms
+        subs = rewriting.compile_rules(subs)
+        if instrumentation.stats is not None:
+            instrumentation.stats.count('Polynomial.simplify terms in', len(self.terms))
+
+        if workers:
+            reduced = parallel.reduce_words(subs, [term.word for term in self.terms], workers)
+            for term, (word, scale) in zip(self.terms, reduced):
+                term._set_word(word)
+                term._coef = term._coef * scale
+        else:
+            for term in self.terms:
+                term.simplify(subs)
+
+        # Collect like terms by accumulating their coefficients against the
+        # operator word
+        coefs = {}
+        for term in self.terms:
+            coefs[term.word] = coefs.get(term.word, 0) + term.coef
 
-        # Now we collect like terms
-        umonos, idx = tools.unique_monomials(self.terms)
-        self.terms = [Monomial(umonos[i].terms, sum([self.terms[j].coef for j in idx[i]])) for i in range(len(idx))]
         # After simplifying we may have introduced some zero terms
-        self.terms = [term for term in self.terms[:] if term.coef != 0]
+        self.terms = [Monomial._from_word(word, coef) for word, coef in coefs.items() if coef != 0]
+        if instrumentation.stats is not None:
+            instrumentation.stats.count('Polynomial.simplify terms out', len(self.terms))
 
         return Polynomial(self)
 
@@ -424,3 +603,135 @@ class Polynomial(object):
         else:
             string += '0'
         return string
+
+
+class PolynomialHash(object):
+    """
+    PolynomialHash Class
+
+    Description:
+                    Running hash of a polynomial built up term by term. Each
+                    term added only updates the contribution of its word, so
+                    the hash of a polynomial assembled from many pieces (e.g.
+                    while parsing or generating it) is available at any time
+                    without collecting all of its terms again. value() equals
+                    the hash of the Polynomial of the terms added so far.
+
+    Attributes:
+                coefs   dict mapping words to their summed coefficients
+                total   sum modulo 2**64 of the hashes of the nonzero terms
+    """
+
+    # Class constructor
+    def __init__(self, polynomial = None):
+        self.coefs = {}
+        self.total = 0
+        if polynomial is not None:
+            self.add_polynomial(polynomial)
+
+    def add(self, word, coef):
+        """
+        Adds the term coef * word (word a tuple of operator ids)
+        """
+        old = self.coefs.get(word, 0)
+        new = old + coef
+        self.coefs[word] = new
+        if old != 0:
+            self.total -= term_hash(word, old)
+        if new != 0:
+            self.total += term_hash(word, new)
+        self.total &= 0xffffffffffffffff
+
+    def add_polynomial(self, polynomial):
+        for term in Polynomial(polynomial).terms:
+            self.add(term.word, term.coef)
+
+    def value(self):
+        return hash(self.total)
+
+
+def _parse_number(token):
+    for kind in (int, float, complex):
+        try:
+            return kind(token)
+        except ValueError:
+            pass
+    raise ValueError('Bad coefficient {}'.format(token))
+
+def _letters(word):
+    # Tuple of the operator ids of a sequence of ids, Operators or Monomials
+    n_operators = len(Operator._table)
+    if isinstance(word, tuple) and all(type(i) is int and 0 <= i < n_operators for i in word):
+        return word
+    letters = []
+    for op in word:
+        if isinstance(op, Monomial):
+            if len(op.word) != 1:
+                raise TypeError('Words should be made of single operators, got {}'.format(op))
+            letters.append(op.word[0])
+        elif isinstance(op, Operator):
+            letters.append(op.id)
+        elif hasattr(op, '__index__'):
+            i = op.__index__()
+            if not 0 <= i < n_operators:
+                raise ValueError('{} is not the id of an operator'.format(i))
+            letters.append(i)
+        else:
+            raise TypeError('Words should be sequences of operator ids, Operators or Monomials')
+    return tuple(letters)
+
+def read_polynomial(source, operators = None, delimiter = None):
+    """
+    Reads a polynomial from lines of the form
+
+        coefficient word
+
+    where the word is a product of operator names separated by spaces or *,
+    a trailing ' denoting an adjoint and Id (or nothing) the identity. With
+    a delimiter (e.g. ',' for CSV files) the coefficient is the text before
+    the first delimiter. Blank lines and lines starting with # are skipped.
+
+    source is a file name, a file object or any iterable of lines, read one
+    line at a time. Operator names are looked up among operators (a list of
+    Operators or degree 1 Monomials) if given, or else among all the
+    operators created so far. Like terms are summed and each distinct term
+    is allocated once.
+    """
+    names = {}
+    if operators is None:
+        operators = Operator._table
+    for op in operators:
+        op = Operator.from_id(op.word[0]) if isinstance(op, Monomial) else op
+        if not op.adjoint:
+            names[op.name] = op.id
+    adjoints = Operator._adjoints
+
+    f = open(source) if isinstance(source, str) else source
+    try:
+        coefs = {}
+        for number, line in enumerate(f):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if delimiter is not None:
+                coef, _, word = line.partition(delimiter)
+            else:
+                coef, word = (line.split(None, 1) + [''])[:2]
+            coef = _parse_number(coef.strip())
+            letters = []
+            for name in word.replace('*', ' ').split():
+                adjoint = name.endswith("'")
+                name = name.rstrip("'")
+                if name == 'Id':
+                    continue
+                i = names.get(name)
+                if i is None:
+                    raise ValueError('Unknown operator {} on line {}'.format(name, number + 1))
+                letters.append(adjoints[i] if adjoint else i)
+            word = tuple(letters)
+            coefs[word] = coefs.get(word, 0) + coef
+    finally:
+        if f is not source:
+            f.close()
+    return Polynomial._from_terms([Monomial._from_word(word, coef) for word, coef in coefs.items() if coef != 0])
+
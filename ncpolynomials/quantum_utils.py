@@ -1,7 +1,10 @@
 """
 Some functions related to the simplification of nc polys
 """
+from hashlib import sha1
+from . import instrumentation
 from . import polynomials as poly
+from . import rewriting
 from . import simplification_utils as su
 
 def generate_measurements(label, io_config):
@@ -16,19 +19,52 @@ def generate_measurements(label, io_config):
 
     return measurements
 
-def projective_measurement_constraints(*parties):
+def measurement_polynomial(parties, indices, coefs):
+    """
+    Builds the polynomial sum_t coefs[t] * prod_p parties[p][x][a] where
+    (x, a) = indices[t][p] are the input and output of party p in term t,
+    allocating each term once.
+    parties - list of the parties' measurements from generate_measurements
+    indices - sequence (e.g. an integer array of shape (n_terms, n_parties,
+              2)) of the (input, output) of every party in every term, a
+              negative input meaning that the party does not appear
+    coefs - sequence of the coefficients of the terms
+    The outputs are those of generate_measurements, i.e. the last output of
+    every input has no operator and cannot be used.
+    """
+    if isinstance(parties[0][0][0], list):
+        parties = parties[0]
+    words = []
+    for term in indices:
+        word = ()
+        for party, (x, a) in zip(parties, term):
+            if x < 0:
+                continue
+            if not 0 <= a < len(party[x]):
+                raise ValueError('Output {} of input {} has no measurement operator'.format(a, x))
+            word = word + party[x][a].word
+        words.append(word)
+    return poly.Polynomial.from_words(words, coefs)
+
+def projective_measurement_constraints(*parties, structured = False):
     """
     Given a collection of parties measurement operators it returns the relevant
     constraints induced by projective measurements. I.e.
     - orthogonality
     - idempotency
     - commutativity
+
+    By default these are returned as a dictionary of substitutions, one for
+    each pair of operators. If structured is True a MeasurementConstraints
+    object applying them directly is returned instead.
     """
     substitutions = {}
 
     # idempotency and orthogonality
     if isinstance(parties[0][0][0], list):
         parties = parties[0]
+    if structured:
+        return MeasurementConstraints(parties)
     for party in parties:
         for measurement in party:
             for projector1 in measurement:
@@ -48,3 +84,188 @@ def projective_measurement_constraints(*parties):
                             substitutions[projector2*projector1] = \
                                 projector1*projector2
     return substitutions
+
+
+def party_level_monomials(parties, level, subs = {}):
+    """
+    Returns the unique reduced monomials of an NPA level such as '1+AB' or
+    '2+AAB', built from the measurement structure of generate_measurements.
+    parties - list of the parties' measurements (lists of lists of monomials)
+    level - int or string of terms joined by '+'. A number k stands for all
+            products of at most k operators, a string of party letters (A for
+            the first party, B for the second, ...) for the products of one
+            operator of each of these parties in that order.
+    The identity comes first, followed by the monomials of each term in
+    order.
+    """
+    subs = rewriting.compile_rules(subs)
+    if isinstance(parties[0][0][0], list):
+        parties = parties[0]
+    monos = [poly.Monomial([])]
+    for term in str(level).split('+'):
+        term = term.strip()
+        if term.isdigit():
+            monos += su.get_all_unique_monomials(su.flatten(parties), int(term), subs)
+            continue
+        factors = []
+        for letter in term:
+            party = ord(letter) - ord('A')
+            if not 0 <= party < len(parties):
+                raise ValueError('Unknown party {} in level {}'.format(letter, level))
+            factors.append([(mono.word, mono.coef) for mono in su.flatten(parties[party])])
+        products = [((), 1)]
+        for factor in factors:
+            products = [(word + w, coef * c) for word, coef in products for w, c in factor]
+        for word, coef in products:
+            word, coef = subs.reduce(word, coef)
+            if coef != 0:
+                monos.append(poly.Monomial._from_word(word, coef))
+    monos, _ = su.unique_monomials(monos)
+    return monos
+
+
+class MeasurementConstraints(rewriting.RewritingSystem):
+    """
+    MeasurementConstraints Class
+
+    Description:
+                    Rewriting system for the constraints of projective
+                    measurements held in structured form rather than as one
+                    substitution per pair of operators. A word is brought to
+                    normal form in one pass: its letters are stably sorted by
+                    party (projectors of different parties commute), repeated
+                    projectors are collapsed (idempotency) and the word is set
+                    to zero if two different projectors of the same measurement
+                    become neighbours (orthogonality). Operators that belong to
+                    no party commute with nothing and are left in place.
+
+                    Any further substitution rules are kept as a generic
+                    RewritingSystem that is applied after the structured ones,
+                    alternating until neither changes the word.
+
+    Attributes:
+                parties     list of parties, each a list of measurements, each a
+                            list of the operator ids of its projectors
+                subs        RewritingSystem of the remaining generic rules
+                fingerprint hex digest identifying the constraints
+                cache       NormalFormCache used to memoize reductions or None
+    """
+
+    # Class constructor
+    def __init__(self, parties, subs = {}, cache = rewriting.normal_form_cache):
+        self.cache = cache
+        self.parties = [[[poly.Monomial(projector).word[0] for projector in measurement]
+                         for measurement in party] for party in parties]
+        self.subs = rewriting.compile_rules(subs)
+        key = [[[(op.name, op.hermitian, op.adjoint) for op in map(poly.Operator.from_id, measurement)]
+                for measurement in party] for party in self.parties]
+        self.fingerprint = sha1((repr(key) + self.subs.fingerprint).encode()).hexdigest()
+        self._build()
+
+    def _build(self):
+        # Party and measurement of every operator id
+        self._party = {}
+        self._measurement = {}
+        for p, party in enumerate(self.parties):
+            for m, measurement in enumerate(party):
+                for letter in measurement:
+                    self._party[letter] = p
+                    self._measurement[letter] = (p, m)
+        self.start = (None, self.subs.start)
+        # Number of rules the constraints stand for, see rules()
+        sizes = [sum(len(measurement) for measurement in party) for party in self.parties]
+        self._n_rules = sum(len(measurement) ** 2 for party in self.parties for measurement in party)
+        self._n_rules += (sum(sizes) ** 2 - sum(size ** 2 for size in sizes)) // 2
+
+    def __getstate__(self):
+        return {'parties' : self.parties, 'subs' : self.subs, 'fingerprint' : self.fingerprint}
+
+    def __setstate__(self, state):
+        self.cache = rewriting.normal_form_cache
+        self.parties = state['parties']
+        self.subs = state['subs']
+        self.fingerprint = state['fingerprint']
+        self._build()
+
+    def __len__(self):
+        return self._n_rules + len(self.subs)
+
+    def rules(self):
+        """
+        Returns the constraints as a list of (lhs word, rhs word, rhs coef,
+        lhs coef) rules, as projective_measurement_constraints would give
+        them, followed by the generic rules
+        """
+        rules = []
+        for party in self.parties:
+            for measurement in party:
+                for a in measurement:
+                    for b in measurement:
+                        rules.append(((a, b), (a,) if a == b else (), 1 if a == b else 0, 1))
+        for n1 in range(len(self.parties)):
+            for n2 in range(n1 + 1, len(self.parties)):
+                for a in [a for measurement in self.parties[n1] for a in measurement]:
+                    for b in [b for measurement in self.parties[n2] for b in measurement]:
+                        rules.append(((b, a), (a, b), 1, 1))
+        return rules + self.subs.rules()
+
+    def _collapse(self, segment, out):
+        """
+        Appends the party sorted and collapsed segment to out. Returns False
+        if the segment is zero.
+        """
+        measurement = self._measurement
+        start = len(out)
+        for letter in sorted(segment, key = self._party.__getitem__):
+            if len(out) > start:
+                last = out[-1]
+                if last == letter:
+                    continue
+                if measurement[last] == measurement[letter]:
+                    return False
+            out.append(letter)
+        return True
+
+    def _reduce(self, word, coef):
+        party = self._party
+        if instrumentation.stats is not None:
+            instrumentation.stats.count('structured_reductions')
+        for _ in range(self.max_steps):
+            out = []
+            segment = []
+            for letter in word:
+                if letter in party:
+                    segment.append(letter)
+                    continue
+                if not self._collapse(segment, out):
+                    return (), coef * 0
+                segment = []
+                out.append(letter)
+            if not self._collapse(segment, out):
+                return (), coef * 0
+            out = tuple(out)
+
+            if len(self.subs) == 0:
+                return out, coef
+            word, coef = self.subs.reduce(out, coef)
+            if coef == 0:
+                return (), coef
+            if word == out:
+                return word, coef
+        raise RuntimeError('Substitution rules did not terminate after %d rewrites' % self.max_steps)
+
+    def advance(self, state, letter):
+        last, substate = state
+        if last is not None and letter in self._party and last in self._party:
+            if self._party[letter] < self._party[last] or letter == last:
+                return None
+            if self._measurement[letter] == self._measurement[last]:
+                return None
+        substate = self.subs.advance(substate, letter)
+        if substate is None:
+            return None
+        return (letter, substate)
+
+    def is_closed(self, letters):
+        # The structured constraints never lengthen a word or add operators
+        return self.subs.is_closed(letters)
@@ -0,0 +1,728 @@
+"""
+Building moment matrices of nc polynomial optimization problems and relaxing
+them to picos SDPs
+"""
+from array import array
+
+from . import instrumentation
+from . import polynomials as poly
+from . import rewriting
+from . import simplification_utils as su
+
+
+class MomentMatrix(object):
+    """
+    MomentMatrix Class
+
+    Description:
+                    Sparse index of the moment matrix
+                        Gamma[i, j] = < m_i^dagger m_j >
+                    of a basis of monomials. Only the upper triangle is
+                    reduced with the substitution rules, the lower triangle
+                    following from Hermiticity. Each distinct reduced word is
+                    a moment and is assigned an integer id, the identity
+                    always being moment 0. The matrix is stored as COO entries
+                    (row, col, moment id, coefficient, conjugation flag), one
+                    for every nonzero entry of the upper triangle.
+
+                    With adjoint=True a word and the reduced form of its
+                    adjoint share a single moment id, the latter being
+                    flagged as the conjugate. Moments whose words are self
+                    adjoint are flagged as real. This halves the number of
+                    free variables of complex relaxations.
+
+                    If blocks (lists of basis indices, e.g. from
+                    term_sparsity_blocks) are given only the entries within a
+                    block are computed and the relaxation constrains each
+                    block, rather than the whole matrix, to be positive
+                    semidefinite.
+
+                    If a WordTable is given the word of every moment is
+                    interned in it, so that moments can be looked up by prefix
+                    and degree (see moments_with_prefix) and matched with the
+                    word ids of SparsePolynomials over the same table.
+
+    Attributes:
+                basis       list of Monomials labelling the rows and columns
+                subs        compiled RewritingSystem used for the reductions
+                adjoint     bool, whether adjoint moments are identified
+                blocks      list of sorted lists of basis indices, or None
+                table       WordTable holding the moment words, or None
+                word_ids    array of the table id of the word of each moment,
+                            None without a table
+                moments     list of the reduced words indexed by moment id
+                real        list of bools flagging the moments that are real
+                rows        row of each entry
+                cols        column of each entry
+                moment_ids  moment id of each entry
+                coefs       coefficient of each entry
+                conj        whether each entry is the conjugate of its moment
+    """
+
+    # Class constructor
+    def __init__(self, basis, subs = {}, adjoint = False, blocks = None, table = None):
+        self.basis = list(basis)
+        self.subs = rewriting.compile_rules(subs)
+        self.adjoint = adjoint
+        self.blocks = [sorted(block) for block in blocks] if blocks is not None else None
+        self.table = table
+        self.word_ids = array('q', [0]) if table is not None else None
+        self.moments = [()]
+        self.real = [True]
+        # Maps reduced words to (moment id, conjugation flag, scale) with
+        # < word > = scale * y[id] or scale * conj(y[id])
+        self._moment_index = {() : (0, False, 1)}
+        self.rows = []
+        self.cols = []
+        self.moment_ids = []
+        self.coefs = []
+        self.conj = []
+        with instrumentation.stage('MomentMatrix'):
+            self._build()
+
+    def _build(self, start = 0):
+        # Adds the entries of the upper triangle in the columns from start on
+        reduce = self.subs.reduce
+        moment = self.moment
+        words = [m.word for m in self.basis]
+        coefs = [m.coef for m in self.basis]
+        lefts = [m.adjword for m in self.basis]
+        left_coefs = [c.conjugate() for c in coefs]
+        if self.blocks is None:
+            pairs = ((i, j) for i in range(len(words)) for j in range(max(i, start), len(words)))
+        else:
+            # Blocks may overlap so the entries are deduplicated
+            pairs = sorted(set((i, j) for block in self.blocks
+                               for a, i in enumerate(block) for j in block[a:]))
+        found = {} if self.blocks is not None else None
+        for i, j in pairs:
+            word, coef = reduce(lefts[i] + words[j], left_coefs[i] * coefs[j])
+            if coef == 0:
+                continue
+            k, conj, scale = moment(word)
+            self.rows.append(i)
+            self.cols.append(j)
+            self.moment_ids.append(k)
+            self.coefs.append(coef * scale)
+            self.conj.append(conj)
+            if found is not None:
+                found[(i, j)] = (k, coef * scale, conj)
+        if found is not None:
+            # Entries of every block numbered within the block, grouped once
+            self._block_entries = []
+            for block in self.blocks:
+                entries = []
+                for a, i in enumerate(block):
+                    for b, j in enumerate(block[a:], a):
+                        value = found.get((i, j))
+                        if value is not None:
+                            entries.append((a, b) + value)
+                self._block_entries.append(entries)
+
+    def extend(self, monomials):
+        """
+        Appends monomials to the basis, computing only the new entries. The
+        existing entries and moment ids are left unchanged.
+        """
+        if self.blocks is not None:
+            raise ValueError('Block structured moment matrices cannot be extended')
+        start = len(self.basis)
+        self.basis.extend(monomials)
+        with instrumentation.stage('MomentMatrix.extend'):
+            self._build(start)
+
+    def __len__(self):
+        return len(self.basis)
+
+    @property
+    def n_moments(self):
+        return len(self.moments)
+
+    def moment(self, word, add = True):
+        """
+        Returns (moment id, conjugation flag, scale) for a reduced word, such
+        that its expectation is scale times the moment or its conjugate. New
+        words are added as moments unless add is False, in which case None is
+        returned.
+        """
+        value = self._moment_index.get(word)
+        if value is None and add:
+            k = len(self.moments)
+            value = (k, False, 1)
+            self._moment_index[word] = value
+            self.moments.append(word)
+            if self.table is not None:
+                self.word_ids.append(self.table.index(word))
+            real = False
+            if self.adjoint:
+                # The adjoint reduces to scale * adj so < adj > = conj(< word >) / scale
+                adj, scale = self.subs.reduce(poly.adjoint_word(word))
+                if adj == word:
+                    real = scale == 1
+                elif scale != 0 and adj not in self._moment_index:
+                    self._moment_index[adj] = (k, True, 1 / scale)
+            self.real.append(real)
+        return value
+
+    def moments_with_prefix(self, prefix, degree = None):
+        """
+        Returns the ids of the moments whose words start with prefix (a word
+        or a Monomial), of length at most degree if given, looked up in the
+        table of the moment words
+        """
+        if self.table is None:
+            raise ValueError('Prefix queries need a MomentMatrix built with a WordTable')
+        if isinstance(prefix, poly.Monomial):
+            prefix = prefix.word
+        node = self.table.find(prefix)
+        if node is None:
+            return []
+        word = self.table.word
+        ids = []
+        for i in self.table.with_prefix(node, degree):
+            # The table also holds the prefixes of the moment words and may
+            # be shared with other objects
+            w = word(i)
+            value = self._moment_index.get(w)
+            if value is not None and self.moments[value[0]] == w:
+                ids.append(value[0])
+        return sorted(ids)
+
+    def entries(self):
+        """
+        Iterates over the (row, col, moment id, coefficient, conjugation flag)
+        entries of the upper triangle
+        """
+        return zip(self.rows, self.cols, self.moment_ids, self.coefs, self.conj)
+
+    def block_entries(self, b):
+        """
+        Returns the entries of block b with rows and columns numbered within
+        the block
+        """
+        return self._block_entries[b]
+
+    def linear_form(self, polynomial):
+        """
+        Reduces polynomial with the substitution rules and returns a dict
+        mapping (moment id, conjugation flag) to the coefficients of its
+        expectation value
+        """
+        return self._linear_form(poly.Polynomial(polynomial), {})
+
+    def _linear_form(self, polynomial, found):
+        # found memoizes the (moment id, conjugation flag, scale) of words
+        # across calls, None for words reducing to zero
+        form = {}
+        for term in polynomial.terms:
+            if term.coef == 0:
+                continue
+            if term.word in found:
+                value = found[term.word]
+            else:
+                value = self._word_moment(term.word)
+                found[term.word] = value
+            if value is None:
+                continue
+            k, conj, scale = value
+            form[(k, conj)] = form.get((k, conj), 0) + term.coef * scale
+        return form
+
+    def _word_moment(self, word):
+        word, coef = self.subs.reduce(word)
+        if coef == 0:
+            return None
+        value = self.moment(word, add = False)
+        if value is None:
+            # The word may only appear in the lower triangle, as the
+            # conjugate of the moment of its adjoint
+            adj, adj_scale = self.subs.reduce(poly.adjoint_word(word))
+            value = self.moment(adj, add = False)
+            if value is None or adj_scale == 0:
+                raise ValueError('Monomial {} is not a moment of the relaxation'.format(poly.Monomial._from_word(word, 1)))
+            k, conj, scale = value
+            value = (k, not conj, (adj_scale * scale).conjugate())
+        k, conj, scale = value
+        return k, conj, coef * scale
+
+    def compile_polynomials(self, polynomials):
+        """
+        Returns the MomentForms of the expectation values of polynomials, to
+        evaluate them all at once on solved moments, see
+        evaluation.MomentForms. Requires numpy and scipy.
+        """
+        from . import evaluation
+        return evaluation.MomentForms(self, polynomials)
+
+    def to_picos(self, name = 'y', real = False):
+        """
+        Returns a picos expression y with one entry per moment and the moment
+        matrix as an affine expression of y, built from a sparse linear map
+        without any dense intermediate. Moments flagged as real are backed by
+        a real variable and the others by a complex variable. For complex
+        relaxations the lower triangle is the conjugate of the upper triangle
+        so the expression is Hermitian. If real is True the relaxation is over
+        real symmetric matrices and all coefficients should be real.
+        """
+        y = self.moment_variables(name, real)
+        return y, _picos_matrix(len(self), self.entries(), y, self.n_moments)
+
+    def moment_variables(self, name = 'y', real = False):
+        """
+        Returns the picos expression of the vector of moments, see to_picos
+        """
+        import cvxopt
+        import picos
+
+        if real:
+            return picos.RealVariable(name, self.n_moments)
+
+        # Embed the real and complex variables into the vector of moments
+        real_ids = [k for k in range(self.n_moments) if self.real[k]]
+        complex_ids = [k for k in range(self.n_moments) if not self.real[k]]
+        x = picos.RealVariable(name + '_real', len(real_ids))
+        y = picos.Constant(cvxopt.spmatrix(1., real_ids, range(len(real_ids)), (self.n_moments, len(real_ids)))) * x
+        if complex_ids:
+            z = picos.ComplexVariable(name + '_complex', len(complex_ids))
+            y = y + picos.Constant(cvxopt.spmatrix(1., complex_ids, range(len(complex_ids)), (self.n_moments, len(complex_ids)))) * z
+        return y
+
+    def expectation(self, polynomial, y):
+        """
+        Returns the expectation value of polynomial as a picos expression of
+        the moments y returned by to_picos
+        """
+        import cvxopt
+        import picos
+
+        rows = [{}, {}]
+        for (k, conj), coef in self.linear_form(polynomial).items():
+            # Conjugation does nothing to real moments
+            row = rows[conj and not y.isreal]
+            row[k] = row.get(k, 0) + complex(coef)
+        value = 0
+        for row, terms in zip(rows, (y, y.conj)):
+            if not row:
+                continue
+            ids = list(row.keys())
+            if y.isreal:
+                c = cvxopt.spmatrix([row[k].real for k in ids], [0] * len(ids), ids, (1, self.n_moments), 'd')
+            else:
+                c = cvxopt.spmatrix([row[k] for k in ids], [0] * len(ids), ids, (1, self.n_moments), 'z')
+            value = value + picos.Constant(c) * terms
+        return value
+
+    def localizing_matrices(self, constraints, basis = None):
+        """
+        Builds the LocalizingMatrix of every Hermitian polynomial g in
+        constraints, i.e. the sparse index of < m_i^dagger g m_j >, in one
+        batch. The reduced adjoints of the basis monomials, the reduced basis
+        monomials and the reduced products of the adjoints with the terms of
+        the constraints are computed once and shared by all constraints.
+
+        basis defaults, for each g, to the monomials m of the moment matrix
+        basis with 2 deg(m) + deg(g) at most twice the degree of that basis.
+        Moments that do not appear in the moment matrix are added to it.
+        """
+        reduce = self.subs.reduce
+        level = max([len(m) for m in self.basis] + [0])
+        prefixes = {}
+        suffixes = {}
+        middles = {}
+        matrices = []
+        with instrumentation.stage('localizing matrices'):
+            for g in constraints:
+                terms = self._hermitian_terms(g)
+                if basis is None:
+                    degree = max([len(word) for word in terms] + [0])
+                    local_basis = [m for m in self.basis if 2 * len(m) + degree <= 2 * level]
+                else:
+                    local_basis = list(basis)
+
+                # Reduced m_i^dagger, m_j and m_i^dagger t for the terms t of g
+                left = []
+                right = []
+                for m in local_basis:
+                    key = (m.word, m.coef)
+                    if key not in prefixes:
+                        prefixes[key] = reduce(m.adjword, m.coef.conjugate())
+                        suffixes[key] = reduce(m.word, m.coef)
+                    left.append(prefixes[key])
+                    right.append(suffixes[key])
+                products = []
+                for prefix, prefix_coef in left:
+                    row = []
+                    for word, coef in terms.items():
+                        key = (prefix, word)
+                        if key not in middles:
+                            middles[key] = reduce(prefix + word)
+                        middle, scale = middles[key]
+                        row.append((middle, prefix_coef * coef * scale))
+                    products.append(row)
+
+                L = LocalizingMatrix(g, local_basis)
+                for i, row in enumerate(products):
+                    for j in range(i, len(right)):
+                        suffix, suffix_coef = right[j]
+                        entry = {}
+                        for middle, coef in row:
+                            word, coef = reduce(middle + suffix, coef * suffix_coef)
+                            if coef == 0:
+                                continue
+                            k, conj, scale = self.moment(word)
+                            entry[(k, conj)] = entry.get((k, conj), 0) + coef * scale
+                        for (k, conj), coef in entry.items():
+                            if coef != 0:
+                                L.rows.append(i)
+                                L.cols.append(j)
+                                L.moment_ids.append(k)
+                                L.coefs.append(coef)
+                                L.conj.append(conj)
+                matrices.append(L)
+        return matrices
+
+    def _hermitian_terms(self, polynomial):
+        # Reduced terms of polynomial as a dict word -> coef, checking that
+        # the polynomial is Hermitian modulo the substitution rules
+        terms = {}
+        adjoints = {}
+        for term in poly.Polynomial(polynomial).terms:
+            word, coef = self.subs.reduce(term.word, term.coef)
+            if coef != 0:
+                terms[word] = terms.get(word, 0) + coef
+            word, coef = self.subs.reduce(term.adjword, term.coef.conjugate())
+            if coef != 0:
+                adjoints[word] = adjoints.get(word, 0) + coef
+        for word in set(terms) | set(adjoints):
+            if abs(terms.get(word, 0) - adjoints.get(word, 0)) > 1e-10:
+                raise ValueError('Localizing matrices need Hermitian polynomials, got {}'.format(polynomial))
+        return dict((word, coef) for word, coef in terms.items() if coef != 0)
+
+    def localizing_expression(self, L, y):
+        """
+        Returns the LocalizingMatrix L as an affine expression of the moments
+        y returned by to_picos
+        """
+        return _picos_matrix(len(L), L.entries(), y, self.n_moments)
+
+    def relaxation(self, objective, direction = 'max', real = False, constraints = []):
+        """
+        Returns a picos Problem optimizing the expectation of objective over
+        the moment matrix together with the moment variable. For complex
+        relaxations the real part of the objective is optimized. Each
+        Hermitian polynomial g in constraints adds the constraint g >= 0
+        through its localizing matrix. Block structured moment matrices are
+        constrained block by block.
+        """
+        import picos
+
+        localizing = self.localizing_matrices(constraints)
+        problem = picos.Problem()
+        if self.blocks is None:
+            y, gamma = self.to_picos(real = real)
+            problem.add_constraint(gamma >> 0)
+        else:
+            # The full matrix is never built
+            y = self.moment_variables(real = real)
+            for b, block in enumerate(self.blocks):
+                problem.add_constraint(_picos_matrix(len(block), self.block_entries(b), y, self.n_moments) >> 0)
+        problem.add_constraint(y[0] == 1)
+        for L in localizing:
+            if len(L) > 0:
+                problem.add_constraint(self.localizing_expression(L, y) >> 0)
+        value = self.expectation(objective, y)
+        if not real:
+            value = value.real
+        problem.set_objective(direction, value)
+        return problem, y
+
+
+class LocalizingMatrix(object):
+    """
+    LocalizingMatrix Class
+
+    Description:
+                    Sparse index of the localizing matrix
+                        L[i, j] = < m_i^dagger g m_j >
+                    of a Hermitian polynomial g, built by
+                    MomentMatrix.localizing_matrices. The entries of the upper
+                    triangle refer to the moment ids of the moment matrix and
+                    are stored as in MomentMatrix; an entry may have several
+                    moments.
+
+    Attributes:
+                polynomial  the polynomial g
+                basis       list of Monomials labelling the rows and columns
+                rows        row of each entry
+                cols        column of each entry
+                moment_ids  moment id of each entry
+                coefs       coefficient of each entry
+                conj        whether each entry is the conjugate of its moment
+    """
+
+    # Class constructor
+    def __init__(self, polynomial, basis):
+        self.polynomial = polynomial
+        self.basis = basis
+        self.rows = []
+        self.cols = []
+        self.moment_ids = []
+        self.coefs = []
+        self.conj = []
+
+    def __len__(self):
+        return len(self.basis)
+
+    def entries(self):
+        return zip(self.rows, self.cols, self.moment_ids, self.coefs, self.conj)
+
+
+class Hierarchy(object):
+    """
+    Hierarchy Class
+
+    Description:
+                    Moment matrix relaxations of increasing level, the level k
+                    basis being the unique reduced monomials of degree at most
+                    k in the base monomials, as from get_all_unique_monomials.
+                    Raising the level only generates and reduces the words of
+                    the new degree and only computes the new blocks of the
+                    moment matrix, the reduced basis and moment index of the
+                    lower levels being kept.
+
+                    The basis is in the same order as the one built from
+                    scratch. Moment ids are assigned as the moments first
+                    appear, so they may be numbered differently.
+
+                    When the substitution rules are closed over the letters
+                    only the irreducible words of the current degree are kept
+                    to be extended. Otherwise all the words of the current
+                    degree are kept, which grows exponentially with the level.
+                    With a WordTable the kept words are table ids, each new
+                    word being a single child lookup from the word it extends.
+
+    Attributes:
+                level           current level
+                basis           list of the Monomials of the current basis
+                subs            compiled RewritingSystem
+                moment_matrix   MomentMatrix of the current basis
+                table           WordTable in which the words of the basis
+                                and the moments are grown, or None
+    """
+
+    # Class constructor
+    def __init__(self, base_monomials, subs = {}, level = 1, adjoint = False, table = None):
+        self.subs = rewriting.compile_rules(subs)
+        self.table = table
+        monoset, _ = su.unique_monomials(su.pick_monomials_of_degree(base_monomials, 1))
+        self._letters = [(mono.word[0], mono.coef) for mono in monoset]
+        self._closed = self.subs.is_closed(set(letter for letter, _ in self._letters))
+        # Words of the current degree as (word, coef, automaton state), the
+        # words being table ids if there is a table
+        self._frontier = [((), 1, self.subs.start)] if table is None else [(0, 1, self.subs.start)]
+        self._seen = set([()])
+        self.level = 0
+        self.moment_matrix = MomentMatrix([poly.Monomial._from_word((), 1)], self.subs, adjoint, table = table)
+        self.set_level(level)
+
+    @property
+    def basis(self):
+        return self.moment_matrix.basis
+
+    def set_level(self, level):
+        """
+        Raises the hierarchy to level. Levels cannot be lowered.
+        """
+        if level < self.level:
+            raise ValueError('Cannot lower the hierarchy from level {} to {}'.format(self.level, level))
+        while self.level < level:
+            self.raise_level()
+        return self.moment_matrix
+
+    def raise_level(self):
+        """
+        Moves up one level and returns the list of the new basis monomials
+        """
+        with instrumentation.stage('Hierarchy.raise_level'):
+            advance = self.subs.advance
+            table = self.table
+            frontier = []
+            for word, coef, state in self._frontier:
+                for letter, letter_coef in self._letters:
+                    nxt = None
+                    if self._closed:
+                        nxt = advance(state, letter)
+                        if nxt is None:
+                            continue
+                    child = word + (letter,) if table is None else table.extend(word, letter)
+                    frontier.append((child, coef * letter_coef, nxt))
+            self._frontier = frontier
+
+            new = []
+            for word, coef, _ in frontier:
+                mono = poly.Monomial._from_word(word if table is None else table.word(word), coef)
+                if not self._closed:
+                    mono = mono.simplify(self.subs)
+                if mono.word not in self._seen:
+                    self._seen.add(mono.word)
+                    new.append(mono)
+            self.level += 1
+            self.moment_matrix.extend(new)
+        return new
+
+    def relaxation(self, objective, direction = 'max', real = False, constraints = []):
+        """
+        Returns the picos Problem of the current level, see
+        MomentMatrix.relaxation
+        """
+        return self.moment_matrix.relaxation(objective, direction, real, constraints)
+
+
+def term_sparsity_blocks(basis, polynomials, subs = {}, iterations = None):
+    """
+    Returns the blocks of basis indices of the term sparsity pattern of the
+    polynomials (typically the objective and the constraints), as lists of
+    indices sorted by their first index.
+
+    Starting from the support made of the reduced words of the polynomials,
+    the identity and the diagonal words m_i^dagger m_i, basis monomials i and
+    j are joined whenever m_i^dagger m_j reduces to a word of the support.
+    The connected components are the blocks, and all the words of the blocks
+    are added to the support before the next iteration. This stops once the
+    blocks no longer change or after the given number of iterations, the
+    first iteration giving the smallest blocks.
+    """
+    subs = rewriting.compile_rules(subs)
+    reduce = subs.reduce
+    n = len(basis)
+    with instrumentation.stage('term_sparsity_blocks'):
+        support = set([()])
+        for polynomial in polynomials:
+            for term in poly.Polynomial(polynomial).terms:
+                word, coef = reduce(term.word, term.coef)
+                if coef != 0:
+                    support.add(word)
+                    support.add(reduce(poly.adjoint_word(word))[0])
+
+        # Reduced words (and adjoints) of the upper triangle
+        pairs = []
+        for i, m in enumerate(basis):
+            left = m.adjword
+            for j in range(i, n):
+                word, coef = reduce(left + basis[j].word)
+                if coef == 0:
+                    continue
+                adj = reduce(poly.adjoint_word(word))[0]
+                pairs.append((i, j, word, adj))
+                if i == j:
+                    support.add(word)
+                    support.add(adj)
+
+        blocks = None
+        iteration = 0
+        while iterations is None or iteration < iterations:
+            parent = list(range(n))
+            def find(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+            for i, j, word, _ in pairs:
+                if word in support:
+                    parent[find(i)] = find(j)
+            components = {}
+            for i in range(n):
+                components.setdefault(find(i), []).append(i)
+            new = sorted(components.values())
+            iteration += 1
+            if new == blocks:
+                break
+            blocks = new
+            for i, j, word, adj in pairs:
+                if find(i) == find(j):
+                    support.add(word)
+                    support.add(adj)
+    return blocks
+
+
+def _picos_matrix(n, entries, y, n_moments):
+    """
+    Returns the n x n Hermitian (or real symmetric if y is real) matrix with
+    upper triangle given by the (row, col, moment id, coefficient,
+    conjugation flag) entries as an affine expression of the moments y
+    """
+    import cvxopt
+    import picos
+
+    size = (n * n, n_moments)
+    if y.isreal:
+        values, I, J = [], [], []
+        for i, j, k, c, conj in entries:
+            if isinstance(c, complex) and c.imag != 0:
+                raise ValueError('Real relaxations need real moment matrix coefficients')
+            values.append(float(c.real))
+            I.append(i + j * n)
+            J.append(k)
+            if i != j:
+                values.append(float(c.real))
+                I.append(j + i * n)
+                J.append(k)
+        A = cvxopt.spmatrix(values, I, J, size, 'd')
+        return (picos.Constant(A) * y).reshaped((n, n))
+
+    (a_values, a_I, a_J), (b_values, b_I, b_J) = _linear_maps(n, entries)
+    A = cvxopt.spmatrix(a_values, a_I, a_J, size, 'z')
+    B = cvxopt.spmatrix(b_values, b_I, b_J, size, 'z')
+    return (picos.Constant(A) * y + picos.Constant(B) * y.conj).reshaped((n, n))
+
+def _linear_maps(n, entries):
+    """
+    Returns the (values, rows, cols) triplets of the sparse (n * n,
+    n_moments) maps A and B with vec(Gamma) = A y + B conj(y), vec stacking
+    the columns of the n x n Hermitian matrix with upper triangle given by
+    the entries. Diagonal entries are split evenly between A and B so that
+    they are real.
+    """
+    a_values, a_I, a_J = [], [], []
+    b_values, b_I, b_J = [], [], []
+    for i, j, k, c, conj in entries:
+        c = complex(c)
+        if i == j:
+            a_values.append((c.conjugate() if conj else c) / 2)
+            a_I.append(i + j * n)
+            a_J.append(k)
+            b_values.append((c if conj else c.conjugate()) / 2)
+            b_I.append(i + j * n)
+            b_J.append(k)
+        elif conj:
+            b_values.append(c)
+            b_I.append(i + j * n)
+            b_J.append(k)
+            a_values.append(c.conjugate())
+            a_I.append(j + i * n)
+            a_J.append(k)
+        else:
+            a_values.append(c)
+            a_I.append(i + j * n)
+            a_J.append(k)
+            b_values.append(c.conjugate())
+            b_I.append(j + i * n)
+            b_J.append(k)
+    return (a_values, a_I, a_J), (b_values, b_I, b_J)
+
+def _real_parts(index, k, conj, c):
+    """
+    Returns the real and imaginary parts of c * y[k] (or c * conj(y[k])) as
+    lists of (variable, coefficient), index mapping (moment id, imaginary
+    part flag) to the real variables. Moments without an imaginary part
+    variable are real.
+    """
+    c = complex(c)
+    re = index.get((k, False))
+    if re is None:
+        raise ValueError('Moment {} is not constrained by the relaxation'.format(k))
+    im = index.get((k, True))
+    if im is None:
+        return [(re, c.real)], [(re, c.imag)]
+    sign = -1 if conj else 1
+    return [(re, c.real), (im, -sign * c.imag)], [(re, c.imag), (im, sign * c.real)]
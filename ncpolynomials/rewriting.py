@@ -0,0 +1,462 @@
+"""
+Compiled rewriting systems for applying substitution rules to monomials
+"""
+from collections import deque, OrderedDict
+from hashlib import sha1
+from . import instrumentation
+from . import polynomials as poly
+
+
+class NormalFormCache(object):
+    """
+    NormalFormCache Class
+
+    Description:
+                    Bounded LRU cache of normal forms. Entries map a rule set
+                    fingerprint together with a word (tuple of operator ids)
+                    to the reduced word and the scale factor picked up by the
+                    coefficient during the reduction.
+
+    Attributes:
+                maxsize     maximum number of entries kept
+                hits        number of successful lookups
+                misses      number of failed lookups
+                evictions   number of entries dropped to respect maxsize
+    """
+
+    # Class constructor
+    def __init__(self, maxsize = 100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, fingerprint, word):
+        """
+        Returns the cached (word, scale) pair or None if it is not cached
+        """
+        key = (fingerprint, word)
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, fingerprint, word, value):
+        self._entries[(fingerprint, word)] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+
+    def invalidate(self, fingerprint = None):
+        """
+        Drops the entries belonging to a rule set fingerprint, or every entry
+        if no fingerprint is given.
+        """
+        if fingerprint is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == fingerprint]:
+                del self._entries[key]
+
+    def info(self):
+        lookups = self.hits + self.misses
+        return {'hits' : self.hits,
+                'misses' : self.misses,
+                'evictions' : self.evictions,
+                'size' : len(self._entries),
+                'maxsize' : self.maxsize,
+                'hit_rate' : self.hits / lookups if lookups else 0.}
+
+
+# Cache shared by all rewriting systems unless told otherwise
+normal_form_cache = NormalFormCache()
+
+
+class RewritingSystem(object):
+    """
+    RewritingSystem Class
+
+    Description:
+                    Compiled form of a dictionary of substitution rules
+                    {old : new}. The left hand sides of the rules are stored
+                    in an Aho-Corasick automaton over the operator ids so the
+                    leftmost occurrence of any rule in a word is found in a
+                    single pass. Words are reduced iteratively: after a
+                    rewrite the scan resumes from the automaton state just
+                    before the replaced letters.
+
+                    If several rules end at the same position the one appearing
+                    first in the substitution dictionary is applied.
+
+                    Normal forms are memoized in a NormalFormCache under the
+                    fingerprint of the rules, so systems compiled from equal
+                    substitution dictionaries share their cached reductions.
+
+    Attributes:
+                _rules      list of (lhs word, rhs word, rhs coef, lhs coef)
+                _goto       list of dicts, transitions of the automaton
+                _fail       list of failure links of the automaton
+                _match      for each state the index of the rule to apply when
+                            the state is reached, -1 if there is none
+                fingerprint hex digest identifying the rules
+                cache       NormalFormCache used to memoize reductions or None
+                max_steps   maximum number of rewrites in a single reduction
+                confluent   True if the rules are known to be confluent (see
+                            complete), False if completion ran out of budget
+                            and None if unknown
+    """
+
+    max_steps = 100000
+    # Automaton state of the empty word, see advance
+    start = 0
+    confluent = None
+
+    # Class constructor
+    def __init__(self, subs = {}, cache = normal_form_cache):
+        self.cache = cache
+        self._rules = []
+        for old, new in subs.items():
+            old = old if isinstance(old, poly.Monomial) else poly.Monomial(old)
+            new = new if isinstance(new, poly.Monomial) else poly.Monomial(new)
+            if len(old) == 0:
+                raise ValueError('Substitution rules must have a non-empty left hand side')
+            self._rules.append((old.word, new.word, new.coef, old.coef))
+        self.fingerprint = self._fingerprint()
+        self._build()
+
+    @classmethod
+    def _from_rules(cls, rules, cache = normal_form_cache):
+        # Builds a system from (lhs word, rhs word, rhs coef, lhs coef) tuples
+        system = cls.__new__(cls)
+        system.cache = cache
+        system._rules = list(rules)
+        system.fingerprint = system._fingerprint()
+        system._build()
+        return system
+
+    def __getstate__(self):
+        # Compact picklable form: the rules as tuples of operator ids and the
+        # fingerprint. The automaton is rebuilt on unpickling and the
+        # unpickled system uses the normal form cache of its process.
+        return {'rules' : self._rules, 'fingerprint' : self.fingerprint, 'confluent' : self.confluent}
+
+    def __setstate__(self, state):
+        self.cache = normal_form_cache
+        self._rules = state['rules']
+        self.fingerprint = state['fingerprint']
+        self.confluent = state.get('confluent')
+        self._build()
+
+    def _fingerprint(self):
+        # Operator ids are local to the process so the fingerprint is taken
+        # over the operators themselves
+        def key(word):
+            return [(op.name, op.hermitian, op.adjoint) for op in map(poly.Operator.from_id, word)]
+        rules = [(key(lhs), key(rhs), new_coef, old_coef) for lhs, rhs, new_coef, old_coef in self._rules]
+        return sha1(repr(rules).encode()).hexdigest()
+
+    def _build(self):
+        # Trie of the left hand sides
+        goto = [{}]
+        match = [-1]
+        for index, rule in enumerate(self._rules):
+            state = 0
+            for letter in rule[0]:
+                nxt = goto[state].get(letter)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto.append({})
+                    match.append(-1)
+                    goto[state][letter] = nxt
+                state = nxt
+            if match[state] < 0:
+                match[state] = index
+
+        # Failure links in breadth first order, inheriting the matches of
+        # the longest proper suffix that is also a state
+        fail = [0 for _ in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for letter, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and letter not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(letter, 0)
+                inherited = match[fail[nxt]]
+                if inherited >= 0 and (match[nxt] < 0 or inherited < match[nxt]):
+                    match[nxt] = inherited
+
+        self._goto = goto
+        self._fail = fail
+        self._match = match
+
+    def __len__(self):
+        return len(self._rules)
+
+    def rules(self):
+        """
+        Returns the list of (lhs word, rhs word, rhs coef, lhs coef) rules
+        """
+        return list(self._rules)
+
+    def _step(self, state, letter):
+        # Transition of the automaton, memoized into the goto table
+        goto = self._goto
+        nxt = goto[state].get(letter)
+        if nxt is None:
+            nxt = self._step(self._fail[state], letter) if state else 0
+            goto[state][letter] = nxt
+        return nxt
+
+    def advance(self, state, letter):
+        """
+        Feeds an operator id to the automaton from state. Returns the new
+        state, or None if the left hand side of a rule ends with this letter,
+        i.e. if the word read so far is reducible. The empty word has state
+        start.
+        """
+        nxt = self._goto[state].get(letter)
+        if nxt is None:
+            nxt = self._step(state, letter)
+        if self._match[nxt] >= 0:
+            return None
+        return nxt
+
+    def is_closed(self, letters):
+        """
+        Checks that no rule lengthens a word or introduces an operator id
+        outside of letters. The normal form of any word of degree d over
+        letters is then an irreducible word of degree at most d over letters.
+        """
+        for lhs, rhs, new_coef, old_coef in self._rules:
+            if new_coef != 0 and (len(rhs) > len(lhs) or not letters.issuperset(rhs)):
+                return False
+        return True
+
+    def invalidate(self):
+        """
+        Drops the cached normal forms of this rule set
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.fingerprint)
+
+    def reduce(self, word, coef = 1):
+        """
+        Reduces a word (tuple of operator ids) with coefficient coef until no
+        rule applies. Returns the reduced word and its coefficient; if the
+        coefficient becomes zero the empty word is returned.
+        """
+        cache = self.cache
+        if cache is None:
+            return self._reduce(word, coef)
+        value = cache.get(self.fingerprint, word)
+        if value is None:
+            value = self._reduce(word, 1)
+            cache.put(self.fingerprint, word, value)
+        return value[0], coef * value[1]
+
+    def _reduce(self, word, coef):
+        rules = self._rules
+        match = self._match
+        goto = self._goto
+        out = []
+        states = [0]
+        pending = list(reversed(word))
+        steps = 0
+        stats = instrumentation.stats
+        while pending:
+            letter = pending.pop()
+            nxt = goto[states[-1]].get(letter)
+            if nxt is None:
+                nxt = self._step(states[-1], letter)
+            out.append(letter)
+            states.append(nxt)
+            index = match[nxt]
+            if index >= 0:
+                lhs, rhs, new_coef, old_coef = rules[index]
+                coef = coef * new_coef / old_coef
+                steps += 1
+                if stats is not None:
+                    stats.rule_hit(self.fingerprint, index)
+                if coef == 0:
+                    break
+                del out[-len(lhs):]
+                del states[-len(lhs):]
+                pending.extend(reversed(rhs))
+                if steps > self.max_steps:
+                    raise RuntimeError('Substitution rules did not terminate after %d rewrites' % self.max_steps)
+        if stats is not None:
+            stats.reduction(steps)
+        if coef == 0:
+            return (), coef
+        return tuple(out), coef
+
+
+# Systems compiled from the most recently used substitution dicts, keyed by
+# the id of the dict, see compile_rules
+_compiled = OrderedDict()
+_compiled_maxsize = 16
+
+def compile_rules(subs):
+    """
+    Returns subs compiled into a RewritingSystem. Systems that are already
+    compiled are returned unchanged so that they can be reused across calls.
+
+    The systems compiled from the last few dicts are memoized, so calling
+    e.g. Monomial.simplify repeatedly with the same dict only compiles it
+    once. A memoized system is reused as long as the dict holds the very
+    same rule objects in the same order (Monomials are immutable), which
+    catches any change made to the dict in between.
+    """
+    if isinstance(subs, RewritingSystem):
+        return subs
+    if not isinstance(subs, dict):
+        return RewritingSystem(subs)
+    entry = _compiled.get(id(subs))
+    if entry is not None:
+        items, system = entry
+        if len(items) == len(subs) and all(old is old_ and new is new_ for (old, new), (old_, new_)
+                                             in zip(items, subs.items())):
+            _compiled.move_to_end(id(subs))
+            return system
+    system = RewritingSystem(subs)
+    # The items are kept so that the ids of the dict and rules are not reused
+    _compiled[id(subs)] = (tuple(subs.items()), system)
+    if len(_compiled) > _compiled_maxsize:
+        _compiled.popitem(last = False)
+    return system
+
+
+def deglex_key(order = None):
+    """
+    Returns the sort key of the degree lexicographic order on words: shorter
+    words come first and words of equal length are compared letter by
+    letter. Letters are ranked by their position in order (a list of
+    Operators or degree 1 Monomials) if given, the others coming after them
+    by operator id.
+    """
+    if order is None:
+        return lambda word: (len(word), word)
+    rank = {}
+    for op in order:
+        i = op.word[0] if isinstance(op, poly.Monomial) else poly.Operator(op).id
+        rank.setdefault(i, len(rank))
+    offset = len(rank)
+    return lambda word: (len(word), tuple([rank.get(i, offset + i) for i in word]))
+
+
+def complete(subs = {}, equalities = [], order = None, max_rules = 1000, max_pairs = 100000, cache = normal_form_cache):
+    """
+    Knuth-Bendix completion of substitution rules into a confluent rewriting
+    system, so that equal words reduce to the same normal form whatever the
+    order the rules are applied in.
+
+    subs - dict of substitution rules {old : new} or a RewritingSystem
+    equalities - polynomials p with the constraints p = 0. Each must have one
+                 or two terms (after collecting like terms), i.e. say that a
+                 word vanishes or is a multiple of another word.
+    order - ranking of the operators for the degree lexicographic order, see
+            deglex_key. Every rule rewrites a word to a multiple of a smaller
+            word (or to zero) in this order.
+
+    Overlaps of left hand sides (critical pairs) are resolved until none is
+    left, rules whose left hand side contains another one are dropped and
+    right hand sides are reduced, which leaves the minimal system. If more
+    than max_rules rules or max_pairs equations are needed the system reached
+    so far is returned with confluent set to False.
+    """
+    key = deglex_key(order)
+    queue = deque()
+    for lhs, rhs, new_coef, old_coef in compile_rules(subs).rules():
+        queue.append((lhs, 1, rhs, new_coef / old_coef))
+    for p in equalities:
+        terms = {}
+        for term in poly.Polynomial(p).terms:
+            terms[term.word] = terms.get(term.word, 0) + term.coef
+        terms = [(word, coef) for word, coef in terms.items() if coef != 0]
+        if len(terms) > 2:
+            raise ValueError('Only equalities with one or two terms can be completed, got {}'.format(p))
+        if len(terms) == 1:
+            queue.append((terms[0][0], terms[0][1], (), 0))
+        elif len(terms) == 2:
+            queue.append((terms[0][0], terms[0][1], terms[1][0], -terms[1][1]))
+
+    # Rules as {lhs : (rhs, scale)} meaning lhs -> scale * rhs
+    rules = {}
+    system = [None]
+
+    def reduce(word):
+        if system[0] is None:
+            system[0] = RewritingSystem._from_rules([(lhs, rhs, scale, 1) for lhs, (rhs, scale) in rules.items()], None)
+        return system[0].reduce(word)
+
+    def overlaps(l1, r1, s1, l2, r2, s2):
+        # Equations from the words l1[:-k] + l2 with l1 ending with l2[:k]
+        for k in range(1, min(len(l1), len(l2))):
+            if l1[-k:] == l2[:k]:
+                queue.append((r1 + l2[k:], s1, l1[:-k] + r2, s2))
+
+    pairs = 0
+    confluent = True
+    while queue:
+        if pairs >= max_pairs or len(rules) > max_rules:
+            confluent = False
+            break
+        pairs += 1
+        u, a, v, b = queue.popleft()
+        # Reduce both sides of a u = b v
+        u, cu = reduce(u) if a != 0 else ((), 0)
+        v, cv = reduce(v) if b != 0 else ((), 0)
+        a, b = a * cu, b * cv
+        if u == v:
+            a, b = a - b, 0
+        if abs(a) < 1e-12 and abs(b) < 1e-12:
+            continue
+        # Orient: the larger word (or the nonzero one) becomes the lhs
+        if abs(b) >= 1e-12 and (abs(a) < 1e-12 or key(v) > key(u)):
+            u, a, v, b = v, b, u, a
+        if u == ():
+            raise ValueError('The substitution rules and equalities imply that the identity is zero')
+        rhs, scale = (v, b / a) if abs(b) >= 1e-12 else ((), 0)
+
+        # Rules containing the new left hand side are turned back into
+        # equations, the others are paired with the new rule
+        for lhs in list(rules):
+            if lhs != u and _contains(lhs, u):
+                r, s = rules.pop(lhs)
+                queue.append((lhs, 1, r, s))
+        rules[u] = (rhs, scale)
+        system[0] = None
+        for lhs, (r, s) in list(rules.items()):
+            overlaps(u, rhs, scale, lhs, r, s)
+            if lhs != u:
+                overlaps(lhs, r, s, u, rhs, scale)
+
+    # Reduced right hand sides, rules sorted by left hand side
+    final = []
+    for lhs in sorted(rules, key = key):
+        rhs, scale = rules[lhs]
+        if scale != 0:
+            rhs, c = reduce(rhs)
+            scale = scale * c
+        final.append((lhs, rhs if scale != 0 else (), scale, 1))
+    if instrumentation.stats is not None:
+        instrumentation.stats.count('completion equations', pairs)
+    completed = RewritingSystem._from_rules(final, cache)
+    completed.confluent = confluent
+    return completed
+
+
+def _contains(word, sub):
+    n = len(sub)
+    return any(word[k : k + n] == sub for k in range(len(word) - n + 1))
+
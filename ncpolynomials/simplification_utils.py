@@ -1,7 +1,10 @@
 """
 Some functions related to the simplification of nc polys
 """
+from . import instrumentation
+from . import parallel
 from . import polynomials as poly
+from . import rewriting
 
 
 def flatten(lol):
@@ -51,31 +54,97 @@ def get_monomials(base_monomials, degree):
     Grabs all monomials of degree 1 from the base set and then generates all
     products up to degree d.
     """
-    id = poly.Monomial([])
+    return list(iter_monomials(base_monomials, degree))
+
+def iter_monomials(base_monomials, degree, subs = {}, table = None):
+    """
+    Lazily generates the products of the degree 1 monomials of the base set
+    up to degree d, in order of increasing degree.
+
+    Words are extended one operator at a time and a word is pruned as soon as
+    it contains the left hand side of a substitution rule, so only the
+    irreducible monomials are generated. Memory use is bounded by the degree
+    rather than by the number of monomials.
+
+    If a WordTable is given the words are grown in it, each extension being a
+    single child lookup, so that the generated words can then be queried by
+    prefix or degree through the table.
+    """
+    subs = rewriting.compile_rules(subs)
     monoset, _ = unique_monomials(pick_monomials_of_degree(base_monomials, 1))
-    monos = [id]
-
-    # Generate all base-len(monoset) strings for length up to d
-    for d in range(1, degree+1):
-        indexes = gen_indexing(len(monoset), d)
-        for index in indexes:
-            temp = id
-            for k in index:
-                temp = temp * monoset[k]
-            monos.append(temp)
-    return monos
+    letters = [(mono.word[0], mono.coef) for mono in monoset]
+
+    if table is not None:
+        extend = table.extend
+        word = table.word
+    for d in range(degree + 1):
+        # Depth first search for the irreducible words of degree d, children
+        # pushed in reverse so the words come out in lexicographic order.
+        # Words are tuples, or table ids if a table is given.
+        stack = [((), 1, subs.start, 0)] if table is None else [(0, 1, subs.start, 0)]
+        while stack:
+            node, coef, state, length = stack.pop()
+            if length == d:
+                yield poly.Monomial._from_word(node if table is None else word(node), coef)
+                continue
+            for letter, letter_coef in reversed(letters):
+                nxt = subs.advance(state, letter)
+                if nxt is not None:
+                    child = node + (letter,) if table is None else extend(node, letter)
+                    stack.append((child, coef * letter_coef, nxt, length + 1))
 
-def get_all_unique_monomials(base_monomials, degree = 1, subs = {}, extra_monomials = []):
+def get_all_unique_monomials(base_monomials, degree = 1, subs = {}, extra_monomials = [], workers = None,
+                             table = None):
     """
     Generates all monomials up to some degree using the base_monomials set.
     Then adding the extra_monomials it simplifies all monomials and picks the
     remaining unique ones out.
+
+    If workers is given (a number of processes or an Executor) the monomials
+    are simplified in parallel. If a WordTable is given the words of the
+    basis are interned in it, see iter_monomials.
     """
     if degree == 0:
         return [poly.Monomial([])]
-    monos = get_monomials([poly.Monomial([])] + base_monomials, degree) + extra_monomials
-    monos = [mon.simplify(subs) for mon in monos]
+    with instrumentation.stage('get_all_unique_monomials'):
+        return _get_all_unique_monomials(base_monomials, degree, subs, extra_monomials, workers, table)
+
+def _get_all_unique_monomials(base_monomials, degree, subs, extra_monomials, workers, table = None):
+    subs = rewriting.compile_rules(subs)
+    letters = set(mono.word[0] for mono in pick_monomials_of_degree(base_monomials, 1))
+    closed = subs.is_closed(letters)
+    if closed:
+        # Every normal form is an irreducible word so the reducible words
+        # can be pruned while generating
+        monos = list(iter_monomials(base_monomials, degree, subs, table))
+        monos += simplify_monomials(extra_monomials, subs, workers)
+    else:
+        monos = get_monomials([poly.Monomial([])] + base_monomials, degree) + extra_monomials
+        monos = simplify_monomials(monos, subs, workers)
+    generated = len(monos)
     monos, _ = unique_monomials(monos)
+    if table is not None and (extra_monomials or not closed):
+        for mono in monos:
+            table.index(mono.word)
+    if instrumentation.stats is not None:
+        instrumentation.stats.count('words generated', generated)
+        instrumentation.stats.count('words kept', len(monos))
+    return monos
+
+
+def simplify_monomials(mono_list, subs, workers = None):
+    """
+    Returns the list of simplified monomials, optionally reducing them in
+    parallel with workers (a number of processes or an Executor).
+    """
+    subs = rewriting.compile_rules(subs)
+    if not workers:
+        return [mono.simplify(subs) for mono in mono_list]
+    reduced = parallel.reduce_words(subs, [mono.word for mono in mono_list], workers)
+    monos = []
+    for mono, (word, scale) in zip(mono_list, reduced):
+        coef = mono.coef * scale
+        monos.append(poly.Monomial._from_word(word if coef != 0 else (), coef))
     return monos
 
 
@@ -89,27 +158,131 @@ def pick_monomials_of_degree(mono_list, degree):
 
 
 
-def unique_monomials(mono_list):
+def unique_monomials(mono_list, adjoint = False):
     """
     Given a list of monomials it returns a list of unique monomials (umonos),
     and then a list of their indexes in the original list
 
+    If adjoint is True a monomial and its adjoint are counted as the same and
+    a third list is returned, flagging for each index whether the monomial
+    found there is the adjoint of the unique one.
+
     NOTE: this function does not care about the coefficients of the monomials.
     """
     umonos = []
     idx = []
+    conj = []
+    # Maps operator words to the index in umonos and the conjugation flag
+    table = {}
 
     for mono_ind, mono in enumerate(mono_list):
-        # Check if mono is same as any of the unique monos
-        found = False
-        for umono_ind, umono in enumerate(umonos):
-            if umono % mono:
-                # If mono already in umono
-                found = True
-                idx[umono_ind].append(mono_ind)
-
-        if not found:
+        found = table.get(mono.word)
+        if found is None:
+            table[mono.word] = (len(umonos), False)
+            if adjoint:
+                table.setdefault(mono.adjword, (len(umonos), True))
             umonos.append(mono)
             idx.append([mono_ind])
+            conj.append([False])
+        else:
+            idx[found[0]].append(mono_ind)
+            conj[found[0]].append(found[1])
+
+    if instrumentation.stats is not None:
+        instrumentation.stats.count('unique_monomials in', len(mono_list))
+        instrumentation.stats.count('unique_monomials out', len(umonos))
 
+    if adjoint:
+        return umonos, idx, conj
     return umonos, idx
+
+
+class ConstraintIndex(object):
+    """
+    ConstraintIndex Class
+
+    Description:
+                    Index of polynomials (constraints, objective pieces, ...)
+                    that recognises polynomials already added, whatever the
+                    order of their terms. With scalar=True polynomials that
+                    are positive multiples of each other are also recognised.
+                    Scaling an inequality g >= 0 by a negative number changes
+                    it, so any nonzero multiple is only merged with
+                    positive=False, which is meant for equality constraints.
+
+                    Polynomials are put in canonical form (simplified with
+                    subs if given) and scaled so that their first term has
+                    modulus 1 (or coefficient 1 with positive=False). The
+                    coefficients are rounded to digits decimals to build the
+                    key.
+
+    Attributes:
+                polynomials     list of the distinct polynomials added, in
+                                order, as given
+                counts          number of times each of them was added
+    """
+
+    # Class constructor
+    def __init__(self, subs = None, scalar = True, positive = True, digits = 12):
+        self.subs = rewriting.compile_rules(subs) if subs is not None else None
+        self.scalar = scalar
+        self.positive = positive
+        self.digits = digits
+        self.polynomials = []
+        self.counts = []
+        self._keys = {}
+
+    def __len__(self):
+        return len(self.polynomials)
+
+    def __contains__(self, polynomial):
+        return self.key(polynomial) in self._keys
+
+    def key(self, polynomial):
+        """
+        Returns the key identifying polynomial up to the allowed scalings
+        """
+        polynomial = poly.Polynomial(polynomial)
+        if self.subs is not None:
+            polynomial = polynomial.simplify(self.subs)
+        terms = [(term.word, term.coef) for term in polynomial.canonical().terms]
+        if self.scalar and terms:
+            scale = terms[0][1]
+            if self.positive:
+                scale = abs(scale)
+            terms = [(word, coef / scale) for word, coef in terms]
+        digits = self.digits
+        return tuple([(word, round(complex(coef).real, digits), round(complex(coef).imag, digits))
+                      for word, coef in terms])
+
+    def add(self, polynomial):
+        """
+        Adds polynomial to the index. Returns the index of the equal (or
+        proportional) polynomial added first and whether polynomial is new.
+        """
+        key = self.key(polynomial)
+        index = self._keys.get(key)
+        if index is not None:
+            self.counts[index] += 1
+            return index, False
+        index = len(self.polynomials)
+        self._keys[key] = index
+        self.polynomials.append(polynomial)
+        self.counts.append(1)
+        return index, True
+
+
+def unique_polynomials(poly_list, subs = None, scalar = True, positive = True):
+    """
+    Given a list of polynomials it returns the list of distinct ones, up to
+    the order of their terms and to positive scalar multiples if scalar is
+    True (any nonzero multiple if positive is also False, for equality
+    constraints only), and then the index in that list of every polynomial
+    of poly_list. See ConstraintIndex.
+    """
+    index = ConstraintIndex(subs, scalar, positive)
+    idx = [index.add(polynomial)[0] for polynomial in poly_list]
+    if instrumentation.stats is not None:
+        instrumentation.stats.count('unique_polynomials in', len(poly_list))
+        instrumentation.stats.count('unique_polynomials out', len(index))
+    return index.polynomials, idx
@@ -0,0 +1,156 @@
+"""
+NumPy backed sparse polynomials
+
+The SparsePolynomial class is an alternative to Polynomial for polynomials
+with many terms where the per-term Python overhead dominates. Requires numpy.
+"""
+import numpy as np
+from . import polynomials as poly
+from . import rewriting
+from .words import word_table
+
+
+def _collect(ids, coefs):
+    """
+    Sorts the word ids, sums the coefficients of repeated ids and drops the
+    zero terms
+    """
+    uids, inverse = np.unique(ids, return_inverse = True)
+    total = np.zeros(len(uids), dtype = coefs.dtype)
+    np.add.at(total, inverse, coefs)
+    keep = total != 0
+    return uids[keep], total[keep]
+
+
+class SparsePolynomial(object):
+    """
+    SparsePolynomial Class
+
+    Description:
+                    Polynomial stored as an array of word ids from a WordTable
+                    together with an aligned array of coefficients. The ids
+                    are kept sorted and unique so addition is an index merge,
+                    scaling is a vector operation and multiplication is an
+                    outer product followed by a word id lookup and a reduction
+                    of the coefficients with np.add.at.
+
+    Attributes:
+                ids         int64 array of sorted unique word ids
+                coefs       float or complex array of the coefficients
+                table       WordTable that the ids refer to
+    """
+
+    # Class constructor
+    def __init__(self, ids = (), coefs = (), table = word_table):
+        ids = np.asarray(ids, dtype = np.int64)
+        coefs = np.asarray(coefs)
+        if coefs.dtype.kind not in 'fc':
+            coefs = coefs.astype(float)
+        if ids.shape != coefs.shape:
+            raise ValueError('Word ids and coefficients should have the same shape')
+        self.table = table
+        self.ids, self.coefs = _collect(ids, coefs)
+
+    @classmethod
+    def _new(cls, ids, coefs, table):
+        # Fast constructor for arrays that are already collected
+        spoly = cls.__new__(cls)
+        spoly.ids = ids
+        spoly.coefs = coefs
+        spoly.table = table
+        return spoly
+
+    @classmethod
+    def from_polynomial(cls, polynomial, table = word_table):
+        """
+        Converts a Polynomial (or Monomial, Operator or number)
+        """
+        polynomial = poly.Polynomial(polynomial)
+        ids = [table.index(term.word) for term in polynomial.terms]
+        coefs = [term.coef for term in polynomial.terms]
+        return cls(ids, coefs, table)
+
+    def to_polynomial(self):
+        """
+        Converts back to a Polynomial
+        """
+        words = self.table.word
+        return poly.Polynomial._from_terms([poly.Monomial._from_word(words(i), c)
+                                           for i, c in zip(self.ids.tolist(), self.coefs.tolist())])
+
+    def _coerce(self, other):
+        if isinstance(other, SparsePolynomial):
+            if other.table is not self.table:
+                raise ValueError('Sparse polynomials should share the same word table')
+            return other
+        elif isinstance(other, (int, float, complex, poly.Operator, poly.Monomial, poly.Polynomial)):
+            return SparsePolynomial.from_polynomial(other, self.table)
+        else:
+            raise TypeError('Bad type for operation with SparsePolynomial')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        return SparsePolynomial(np.concatenate((self.ids, other.ids)),
+                                np.concatenate((self.coefs, other.coefs)),
+                                self.table)
+    def __radd__(self, other):
+        return self + other
+    def __sub__(self, other):
+        return self + (-self._coerce(other))
+    def __rsub__(self, other):
+        return -(self - other)
+
+    def __neg__(self):
+        return SparsePolynomial._new(self.ids, -self.coefs, self.table)
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float, complex, np.number)):
+            if other == 0:
+                return SparsePolynomial(table = self.table)
+            return SparsePolynomial._new(self.ids, self.coefs * other, self.table)
+        other = self._coerce(other)
+        concat = self.table.concat
+        right = other.ids.tolist()
+        ids = np.fromiter((concat(i, j) for i in self.ids.tolist() for j in right),
+                          dtype = np.int64, count = len(self) * len(other))
+        coefs = np.outer(self.coefs, other.coefs).ravel()
+        return SparsePolynomial(ids, coefs, self.table)
+    def __rmul__(self, other):
+        if isinstance(other, (int, float, complex, np.number)):
+            return self * other
+        return self._coerce(other) * self
+
+    @property
+    def degree(self):
+        return max([len(self.table.word(i)) for i in self.ids.tolist()] + [0])
+
+    def adj(self):
+        adjoint = self.table.adjoint
+        ids = np.array([adjoint(i) for i in self.ids.tolist()], dtype = np.int64)
+        return SparsePolynomial(ids, self.coefs.conj(), self.table)
+
+    def simplify(self, subs):
+        """
+        Returns the polynomial with every word reduced by the substitutions
+        subs and like terms collected
+        """
+        subs = rewriting.compile_rules(subs)
+        words = self.table.word
+        index = self.table.index
+        ids = []
+        scales = []
+        for i in self.ids.tolist():
+            word, scale = subs.reduce(words(i))
+            ids.append(index(word))
+            scales.append(scale)
+        return SparsePolynomial(ids, self.coefs * np.array(scales), self.table)
+
+    def iszero(self):
+        # Warning it is advisable to simplify the polynomial first
+        return not np.any(np.abs(self.coefs) > 1e-10)
+
+    def __repr__(self):
+        return self.to_polynomial().__repr__()
@@ -0,0 +1,266 @@
+"""
+Solving a relaxation for many objectives
+
+A Sweep compiles a MomentMatrix (and localizing constraints) once into the
+standard form of cvxopt's SDP solver. Each objective is then only mapped to
+a sparse coefficient vector over the moments and the solves can be spread
+over a pool of worker processes, the results streaming back as they
+complete:
+
+    sweep = Sweep(MomentMatrix(basis, subs))
+    for index, value, status in sweep.run(objectives, workers = 4):
+        ...
+
+Requires cvxopt.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+
+from . import instrumentation
+from . import relaxation
+
+# Compiled problem of a worker process of a pool created by Sweep.run
+_worker_problem = None
+
+
+def _init_worker(problem):
+    global _worker_problem
+    _worker_problem = problem
+
+def _solve(problem, vector, direction):
+    import cvxopt
+    from cvxopt import solvers
+
+    G, h, n_variables = problem
+    indices, coefs = vector
+    # cvxopt minimizes, moment 0 (variable 0) is fixed to 1
+    sign = 1 if direction == 'min' else -1
+    c = cvxopt.matrix(0., (n_variables, 1))
+    for var, value in zip(indices, coefs):
+        c[var] += sign * value
+    A = cvxopt.spmatrix(1., [0], [0], (1, n_variables))
+    b = cvxopt.matrix(1.)
+    # The fast CHOL KKT solver first, falling back on LDL as picos does
+    solution = None
+    with instrumentation.stage('Sweep solve'):
+        for kktsolver in ('chol', 'ldl'):
+            try:
+                attempt = solvers.sdp(c, Gs = G, hs = h, A = A, b = b, kktsolver = kktsolver,
+                                      options = {'show_progress' : False})
+            except (ValueError, ArithmeticError):
+                continue
+            if solution is None or attempt['status'] != 'unknown':
+                solution = attempt
+            if solution['status'] != 'unknown':
+                break
+    if solution is None:
+        return None, 'failed'
+    if solution['x'] is None or solution['status'] in ('primal infeasible', 'dual infeasible'):
+        return None, solution['status']
+    x = solution['x']
+    return sum(value * x[var] for var, value in zip(indices, coefs)), solution['status']
+
+def _solve_point(index, vector, direction, problem = None):
+    return (index,) + _solve(problem or _worker_problem, vector, direction)
+
+def _is_psd(block):
+    import cvxopt
+    from cvxopt import lapack
+
+    M = cvxopt.matrix(0., (block.size, block.size))
+    for (position, _), value in block.linear.items():
+        M[position] += value
+    eigenvalues = cvxopt.matrix(0., (block.size, 1))
+    lapack.syev(M, eigenvalues)
+    return min(eigenvalues) >= -1e-10
+
+
+class _Block(object):
+    # Real symmetric matrix linear in the variables, built entry by entry
+
+    def __init__(self, size):
+        self.size = size
+        self.linear = {}
+
+    def add(self, i, j, var, value):
+        if value != 0:
+            key = (i + j * self.size, var)
+            self.linear[key] = self.linear.get(key, 0) + value
+
+
+class Sweep(object):
+    """
+    Sweep Class
+
+    Description:
+                    Relaxation compiled once for many objectives. The moment
+                    matrix (each of its blocks if it is block structured) and
+                    the localizing matrices of the constraints are written as
+                    real linear matrix inequalities in the real and imaginary
+                    parts of the moments, moment 0 being fixed to 1 by an
+                    equality. Complex Hermitian matrices are embedded as the
+                    real symmetric matrices [[Re, -Im], [Im, Re]].
+
+                    An objective polynomial is mapped to a sparse coefficient
+                    vector over these variables (the real part of its
+                    expectation) and solved with cvxopt.solvers.sdp. Moments
+                    that only ever appear in fixed combinations (which can
+                    happen when localizing matrices are combined with a block
+                    structured moment matrix) make the problem rank deficient
+                    and the solver may then fail, with status 'failed'.
+
+    Attributes:
+                moment_matrix   the MomentMatrix
+                real            bool, whether the relaxation is over real
+                                symmetric matrices
+                variables       list of (moment id, imaginary part flag) of
+                                each variable
+    """
+
+    # Class constructor
+    def __init__(self, moment_matrix, constraints = [], real = False):
+        self.moment_matrix = moment_matrix
+        self.real = real
+        with instrumentation.stage('Sweep compile'):
+            mm = moment_matrix
+            # Localizing matrices first as they may add moments
+            localizing = [L for L in mm.localizing_matrices(constraints) if len(L) > 0]
+            self.variables = []
+            self._index = {}
+            for k in range(mm.n_moments):
+                self._index[(k, False)] = len(self.variables)
+                self.variables.append((k, False))
+                if not real and not mm.real[k]:
+                    self._index[(k, True)] = len(self.variables)
+                    self.variables.append((k, True))
+
+            if mm.blocks is None:
+                matrices = [(len(mm), mm.entries())]
+            else:
+                matrices = [(len(block), mm.block_entries(b)) for b, block in enumerate(mm.blocks)]
+            matrices += [(len(L), L.entries()) for L in localizing]
+            blocks = [self._compile(n, entries) for n, entries in matrices]
+            # Blocks only involving moment 0 are constant, e.g. the 1 x 1
+            # block of the identity, and make the problem degenerate
+            constant = [block for block in blocks if all(var == 0 for _, var in block.linear)]
+            if any(not _is_psd(block) for block in constant):
+                raise ValueError('The relaxation is infeasible')
+            blocks = [block for block in blocks if block not in constant]
+
+            # Drop the variables that appear in no matrix, e.g. the imaginary
+            # parts of moments only found on diagonals. Moment 0 is kept as
+            # variable 0, which the solver fixes to 1, even if it only
+            # appeared in dropped constant blocks
+            used = sorted(set(var for block in blocks for _, var in block.linear) | set([0]))
+            column = dict((var, col) for col, var in enumerate(used))
+            self.variables = [self.variables[var] for var in used]
+            self._index = dict((key, column[var]) for key, var in self._index.items() if var in column)
+            self._G = []
+            self._h = []
+            for block in blocks:
+                G, h = self._matrices(block, column)
+                self._G.append(G)
+                self._h.append(h)
+
+    def _terms(self, k, conj, c):
+        return relaxation._real_parts(self._index, k, conj, c)
+
+    def _compile(self, n, entries):
+        if self.real:
+            block = _Block(n)
+            for i, j, k, c, conj in entries:
+                if isinstance(c, complex) and c.imag != 0:
+                    raise ValueError('Real relaxations need real moment matrix coefficients')
+                for var, value in self._terms(k, conj, c)[0]:
+                    block.add(i, j, var, value)
+                    if i != j:
+                        block.add(j, i, var, value)
+        else:
+            block = _Block(2 * n)
+            for i, j, k, c, conj in entries:
+                re, im = self._terms(k, conj, c)
+                for var, value in re:
+                    block.add(i, j, var, value)
+                    block.add(i + n, j + n, var, value)
+                    if i != j:
+                        block.add(j, i, var, value)
+                        block.add(j + n, i + n, var, value)
+                if i == j:
+                    # Diagonal entries are real
+                    continue
+                for var, value in im:
+                    block.add(i + n, j, var, value)
+                    block.add(i, j + n, var, -value)
+                    block.add(j + n, i, var, -value)
+                    block.add(j, i + n, var, value)
+
+        return block
+
+    def _matrices(self, block, column):
+        import cvxopt
+
+        # cvxopt wants sum_k x_k G_k <= h, i.e. G_k = -M_k and h = 0
+        size = block.size
+        keys = list(block.linear.keys())
+        G = cvxopt.spmatrix([-block.linear[key] for key in keys], [key[0] for key in keys],
+                            [column[key[1]] for key in keys], (size * size, len(self.variables)), 'd')
+        return G, cvxopt.matrix(0., (size, size))
+
+    def objective_vector(self, polynomial):
+        """
+        Returns the real part of the expectation of polynomial as a sparse
+        vector (variable indices, coefficients)
+        """
+        coefs = {}
+        for (k, conj), c in self.moment_matrix.linear_form(polynomial).items():
+            for var, value in self._terms(k, conj, c)[0]:
+                coefs[var] = coefs.get(var, 0) + value
+        indices = list(coefs.keys())
+        return indices, [coefs[var] for var in indices]
+
+    @property
+    def problem(self):
+        # Everything a worker needs to solve for an objective vector
+        return self._G, self._h, len(self.variables)
+
+    def solve_vector(self, vector, direction = 'max'):
+        """
+        Returns the (value, cvxopt status) of the relaxation for an objective
+        vector from objective_vector. The value is None if the solver failed
+        or the problem is infeasible or unbounded.
+        """
+        return _solve(self.problem, vector, direction)
+
+    def solve(self, objective, direction = 'max'):
+        """
+        Returns the (value, cvxopt status) of the relaxation for objective
+        """
+        return self.solve_vector(self.objective_vector(objective), direction)
+
+    def run(self, objectives, direction = 'max', workers = None):
+        """
+        Solves the relaxation for every objective, yielding (index, value,
+        status) in order of completion.
+
+        workers is either the number of worker processes to use or an
+        existing concurrent.futures Executor, which is then sent the compiled
+        problem with every objective. With no workers the objectives are
+        solved one after the other in this process.
+        """
+        vectors = [self.objective_vector(objective) for objective in objectives]
+        if not workers or (not isinstance(workers, Executor) and workers <= 1):
+            for index, vector in enumerate(vectors):
+                yield (index,) + self.solve_vector(vector, direction)
+            return
+
+        if isinstance(workers, Executor):
+            futures = [workers.submit(_solve_point, index, vector, direction, self.problem)
+                       for index, vector in enumerate(vectors)]
+            for future in as_completed(futures):
+                yield future.result()
+            return
+
+        with ProcessPoolExecutor(workers, initializer = _init_worker, initargs = (self.problem,)) as executor:
+            futures = [executor.submit(_solve_point, index, vector, direction)
+                       for index, vector in enumerate(vectors)]
+            for future in as_completed(futures):
+                yield future.result()
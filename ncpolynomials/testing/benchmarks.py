@@ -0,0 +1,197 @@
+"""
+Benchmarks of the algebra and relaxation building hot paths
+
+Runs parameterized sweeps over the number of operators, the degree and the
+size of the rule set, recording the wall time and the peak memory of every
+point. Results are written as JSON and can be compared against a saved
+baseline:
+
+    python -m ncpolynomials.testing.benchmarks -o baseline.json
+    python -m ncpolynomials.testing.benchmarks --compare baseline.json
+
+Use --quick for a smaller sweep and --filter to select benchmarks by name.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from statistics import median
+
+from ncpolynomials.polynomials import Monomial, Polynomial
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.rewriting import normal_form_cache
+from ncpolynomials.simplification_utils import (flatten, generate_operators, get_monomials,
+                                                get_all_unique_monomials, unique_monomials)
+
+
+def _scenario(parties, inputs, outputs):
+    # Measurement operators and projective constraints of a Bell scenario
+    ops = [generate_measurements(chr(ord('A') + k), [outputs] * inputs) for k in range(parties)]
+    return ops, projective_measurement_constraints(*ops)
+
+def bench_get_monomials(n_ops, degree):
+    ops = generate_operators('X', n_ops)
+    return lambda: get_monomials(ops, degree)
+
+def bench_get_all_unique_monomials(parties, inputs, outputs, degree):
+    ops, subs = _scenario(parties, inputs, outputs)
+    ops = flatten(ops)
+    return lambda: get_all_unique_monomials(ops, degree, subs)
+
+def bench_unique_monomials(n_ops, degree):
+    monos = get_monomials(generate_operators('X', n_ops), degree)
+    # Every monomial appears twice
+    monos = monos + monos
+    return lambda: unique_monomials(monos)
+
+def bench_monomial_simplify(parties, inputs, outputs, length):
+    ops, subs = _scenario(parties, inputs, outputs)
+    ops = flatten(ops)
+    # Deterministic words cycling through the operators
+    words = []
+    for start in range(len(ops)):
+        mono = Monomial([])
+        for k in range(length):
+            mono = mono * ops[(start + 3 * k) % len(ops)]
+        words.append(mono)
+    return lambda: [Monomial(mono).simplify(subs) for mono in words]
+
+def bench_chsh_chain():
+    # The chain of products from testing_polynomial_simplification.py
+    id = Monomial([])
+    X = generate_operators('X', 2, 1)
+    Y = generate_operators('Y', 2, 1)
+    Z = generate_operators('Z', 2, 1)
+    Aops = [X[0], Y[0], Z[0]]
+    Bops = [X[1], Y[1], Z[1]]
+    subs = {}
+    for x in range(3):
+        for y in range(3):
+            subs.update({Bops[y] * Aops[x] : Aops[x] * Bops[y]})
+        subs.update({Aops[x]*Aops[x] : id})
+        subs.update({Bops[x]*Bops[x] : id})
+
+    def run():
+        poly1 = Polynomial(id - Z[0] + Z[1] - Z[1]*Z[0])
+        for factor in [X[0], id + X[0]*Y[0] + X[1]*Y[1] + X[1]*Y[1]*X[0]*Y[0],
+                       id + Y[0]*X[0] + Y[1]*X[1] + Y[0]*X[0]*Y[1]*X[1],
+                       X[1], id + Z[0] - Z[1] - Z[0]*Z[1]]:
+            poly1 = poly1 * factor
+        return poly1.simplify(subs)
+    return run
+
+def bench_projective_measurement_constraints(parties, inputs, outputs):
+    ops = [generate_measurements(chr(ord('A') + k), [outputs] * inputs) for k in range(parties)]
+    return lambda: projective_measurement_constraints(*ops)
+
+
+# name -> (benchmark, full sweep, quick sweep)
+BENCHMARKS = {
+    'get_monomials' : (bench_get_monomials,
+        [{'n_ops' : n, 'degree' : d} for n in (2, 4, 8) for d in (2, 4, 6) if n ** d <= 1000000],
+        [{'n_ops' : n, 'degree' : d} for n in (2, 4) for d in (2, 4)]),
+    'get_all_unique_monomials' : (bench_get_all_unique_monomials,
+        [{'parties' : 2, 'inputs' : m, 'outputs' : o, 'degree' : d} for m in (2, 3, 4) for o in (2, 3) for d in (1, 2, 3, 4)],
+        [{'parties' : 2, 'inputs' : 2, 'outputs' : 2, 'degree' : d} for d in (1, 2)]),
+    'unique_monomials' : (bench_unique_monomials,
+        [{'n_ops' : n, 'degree' : d} for n in (4, 8) for d in (2, 4)],
+        [{'n_ops' : 4, 'degree' : 2}]),
+    'Monomial.simplify' : (bench_monomial_simplify,
+        [{'parties' : p, 'inputs' : m, 'outputs' : 3, 'length' : l} for p in (2, 3) for m in (2, 4) for l in (4, 8, 16)],
+        [{'parties' : 2, 'inputs' : 2, 'outputs' : 3, 'length' : l} for l in (4, 8)]),
+    'Polynomial.__mul__+simplify' : (bench_chsh_chain, [{}], [{}]),
+    'projective_measurement_constraints' : (bench_projective_measurement_constraints,
+        [{'parties' : p, 'inputs' : m, 'outputs' : o} for p in (2, 3) for m in (2, 4) for o in (2, 4)],
+        [{'parties' : 2, 'inputs' : 2, 'outputs' : 2}]),
+}
+
+
+def measure(func, repeat):
+    """
+    Returns the wall times of repeat calls and the peak traced memory of an
+    extra call. Normal forms are uncached before every call.
+    """
+    times = []
+    for _ in range(repeat):
+        normal_form_cache.invalidate()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    normal_form_cache.invalidate()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return times, peak
+
+def run(names, quick = False, repeat = 3):
+    results = []
+    for name in names:
+        bench, full, small = BENCHMARKS[name]
+        for params in (small if quick else full):
+            times, peak = measure(bench(**params), repeat)
+            results.append({'name' : name,
+                            'params' : params,
+                            'time' : {'min' : min(times), 'median' : median(times), 'repeat' : repeat},
+                            'peak_memory' : peak})
+            print('{:<36} {:<60} {:>10.4f}s {:>12d}B'.format(name, json.dumps(params), min(times), peak))
+    return results
+
+def _key(result):
+    return (result['name'], json.dumps(result['params'], sort_keys = True))
+
+def compare(results, baseline, threshold = 1.1):
+    """
+    Prints the ratio of the times and peak memories to those of the matching
+    baseline results and returns the number of regressions, i.e. time ratios
+    above threshold.
+    """
+    base = dict((_key(result), result) for result in baseline['results'])
+    regressions = 0
+    for result in results:
+        old = base.get(_key(result))
+        if old is None:
+            continue
+        time_ratio = result['time']['min'] / max(old['time']['min'], 1e-12)
+        memory_ratio = result['peak_memory'] / max(old['peak_memory'], 1)
+        flag = ''
+        if time_ratio > threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        print('{:<36} {:<60} time x{:<8.3f} memory x{:<8.3f} {}'.format(
+            result['name'], json.dumps(result['params']), time_ratio, memory_ratio, flag))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmarks of the ncpolynomials hot paths')
+    parser.add_argument('-o', '--output', help = 'write the results as JSON to this file')
+    parser.add_argument('--compare', help = 'baseline JSON file to compare against')
+    parser.add_argument('--threshold', type = float, default = 1.1, help = 'time ratio counted as a regression')
+    parser.add_argument('--quick', action = 'store_true', help = 'run the small sweep')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'timed calls per point')
+    parser.add_argument('--filter', default = '', help = 'only run benchmarks whose name contains this')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    results = run(names, args.quick, args.repeat)
+    report = {'meta' : {'python' : sys.version,
+                        'platform' : platform.platform(),
+                        'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'quick' : args.quick},
+              'results' : results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
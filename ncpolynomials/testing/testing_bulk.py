@@ -0,0 +1,77 @@
+"""
+Checks of the bulk polynomial constructors and of the text parser against
+polynomials built by summing terms. Requires numpy.
+
+    python -m ncpolynomials.testing.testing_bulk
+"""
+import io
+
+import numpy as np
+
+from ncpolynomials.polynomials import Polynomial, read_polynomial
+from ncpolynomials.quantum_utils import generate_measurements, measurement_polynomial
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+# CHSH in Collins-Gisin form
+chsh = A[0][0]*B[0][0] + A[0][0]*B[1][0] + A[1][0]*B[0][0] - A[1][0]*B[1][0] - A[0][0] - B[0][0]
+
+# From aligned arrays of words (operator ids) and coefficients
+ids = lambda m : m.word[0]
+words = np.array([[ids(A[x][0]), ids(B[y][0])] for x in range(2) for y in range(2)])
+coefs = np.array([1, 1, 1, -1])
+p = Polynomial.from_words(list(words) + [(ids(A[0][0]),), [B[0][0]]], list(coefs) + [-1, -1])
+assert p == chsh, p
+assert Polynomial.from_words([(ids(A[0][0]),)] * 2, [1, -1]) == Polynomial([])
+assert len(Polynomial.from_words([(ids(A[0][0]),)] * 2, [1, -1], collect = False)) == 2
+for bad in ([(10 ** 9,)], [(-1,)]):
+    try:
+        Polynomial.from_words(bad, [1])
+        assert False, bad
+    except ValueError:
+        pass
+try:
+    Polynomial.from_words([['A00']], [1])
+    assert False
+except TypeError:
+    pass
+
+# From (input, output) indices of every party, -1 leaving a party out
+indices = np.array([[[x, 0], [y, 0]] for x in range(2) for y in range(2)] + [[[0, 0], [-1, 0]], [[-1, 0], [0, 0]]])
+assert measurement_polynomial([A, B], indices, np.array([1, 1, 1, -1, -1, -1])) == chsh
+try:
+    measurement_polynomial([A, B], [[[0, 1], [0, 0]]], [1])
+    assert False
+except ValueError:
+    pass
+print('from_words and measurement_polynomial:', chsh)
+
+# Parsing, with whitespace, tabs or a delimiter between the coefficient and
+# the word
+text = """# CHSH in Collins-Gisin form
+1 A00 B00
+1\tA00*B10
+1 A10 B00
+-1 A10 B10
+-1 A00
+-0.5 B00
+-0.5 B00
+2.5 Id
+"""
+assert read_polynomial(io.StringIO(text)) == chsh + 2.5
+csv = ['1,A00 B00', '1,A00*B10', '1, A10 B00', '-1,A10 B10', '-1,A00', '-1,B00', '2.5,']
+assert read_polynomial(csv, delimiter = ',') == chsh + 2.5
+try:
+    read_polynomial(['1 Z99'])
+    assert False
+except ValueError:
+    pass
+print('read_polynomial: whitespace, tabs and CSV')
+
+# add_terms works in place, += leaves the aliases of a polynomial alone
+p = Polynomial(A[0][0])
+q = p
+p += B[0][0]
+assert q == Polynomial(A[0][0]) and p == A[0][0] + B[0][0]
+assert q.add_terms(B[1][0]) is q and q == A[0][0] + B[1][0]
+print('add_terms in place, += copies')
@@ -0,0 +1,53 @@
+"""
+Checks of the Knuth-Bendix completion: the presentation a^2 = b^2 = 1,
+aba = bab of S3 must complete to a confluent system with 6 normal forms, two
+words having the same normal form exactly when they are the same
+permutation.
+
+    python -m ncpolynomials.testing.testing_completion
+"""
+import itertools
+
+from ncpolynomials import rewriting
+from ncpolynomials.polynomials import Monomial, Polynomial
+from ncpolynomials.simplification_utils import generate_operators
+
+a, b = generate_operators('X', 2, 1)
+id = Monomial([])
+S3 = rewriting.complete({a*a : id, b*b : id, a*b*a : b*a*b}, order = [a, b])
+assert S3.confluent and len(S3.rules()) == 3
+
+# a and b as the transpositions (0 1) and (1 2)
+perms = {a.word[0] : (1, 0, 2), b.word[0] : (0, 2, 1)}
+permutation = {}
+for n in range(8):
+    for word in itertools.product(sorted(perms), repeat = n):
+        p = (0, 1, 2)
+        for letter in word:
+            p = tuple(perms[letter][i] for i in p)
+        normal_form = S3.reduce(word)
+        assert normal_form[1] == 1
+        assert permutation.setdefault(normal_form, p) == p, (word, normal_form)
+assert len(permutation) == 6 and len(set(permutation.values())) == 6
+print('S3:', len(permutation), 'normal forms', sorted(w for w, _ in permutation))
+
+# Equalities with one or two terms, including scalars
+commuting = rewriting.complete({}, equalities = [a*b - b*a, a*a - a], order = [a, b])
+assert commuting.confluent
+assert commuting.reduce(b.word + a.word + a.word + b.word) == (a.word + b.word + b.word, 1)
+vanishing = rewriting.complete({}, equalities = [a*b - 2*(b*a), b*a - 3*(a*b)], order = [a, b])
+assert vanishing.reduce(a.word + b.word)[1] == 0 and vanishing.reduce(b.word + a.word)[1] == 0
+
+# Running out of budget and unsupported equalities
+assert not rewriting.complete({a*b*a : b*a*b}, order = [a, b], max_pairs = 1).confluent
+try:
+    rewriting.complete({}, equalities = [a*b - b*a + a])
+    assert False, 'three term equality accepted'
+except ValueError:
+    pass
+try:
+    rewriting.complete({}, equalities = [Polynomial(a) - 1, Polynomial(a)])
+    assert False, 'identity reduced to zero'
+except ValueError:
+    pass
+print('Completion of equalities and budgets checked')
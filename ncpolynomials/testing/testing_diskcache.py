@@ -0,0 +1,55 @@
+"""
+Checks of the on-disk cache of bases and moment matrices, in a temporary
+directory. Requires numpy.
+
+    python -m ncpolynomials.testing.testing_diskcache
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from ncpolynomials.diskcache import DiskCache, decode_words, encode_words
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix
+from ncpolynomials.simplification_utils import flatten, get_all_unique_monomials
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+ops = flatten(A + B)
+basis = get_all_unique_monomials(ops, 2, subs)
+words = [m.word for m in basis]
+assert decode_words(*encode_words(words)) == words
+
+path = tempfile.mkdtemp()
+try:
+    cache = DiskCache(path)
+    # A miss computes and stores, a hit loads the same basis and matrix
+    for attempt in range(2):
+        cached = cache.get_all_unique_monomials(ops, 2, subs)
+        assert [(m.word, m.coef) for m in cached] == [(m.word, m.coef) for m in basis]
+        mm = cache.moment_matrix(cached, subs)
+        expected = MomentMatrix(basis, subs)
+        assert mm.moments == expected.moments and mm.real == expected.real
+        assert list(mm.entries()) == list(expected.entries())
+        assert mm.linear_form(A[0][0]*B[0][0]) == expected.linear_form(A[0][0]*B[0][0])
+    assert len(os.listdir(path)) == 2
+    assert cache.basis_key(ops, 3, subs) not in cache
+
+    # A stored entry is never replaced, a broken one is
+    cache.save('entry', {'a' : np.arange(3)}, {'run' : 1})
+    cache.save('entry', {'a' : np.arange(5)}, {'run' : 2})
+    arrays, meta = cache.load('entry')
+    assert meta['run'] == 1 and list(arrays['a']) == [0, 1, 2]
+    os.remove(os.path.join(path, 'entry', 'meta.json'))
+    assert 'entry' not in cache
+    cache.save('entry', {'a' : np.arange(5)}, {'run' : 3})
+    assert cache.load('entry', mmap = False)[1]['run'] == 3
+
+    cache.invalidate()
+    assert os.listdir(path) == []
+finally:
+    shutil.rmtree(path)
+print('DiskCache: bases and moment matrices round trip')
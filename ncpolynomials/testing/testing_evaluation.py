@@ -0,0 +1,62 @@
+"""
+Checks of the Evaluator: the optimal CHSH strategy must give 2 sqrt(2),
+batches of states must agree with their density matrices and the adjoint of
+a non-Hermitian operator must default to the conjugate transpose. Requires
+numpy.
+
+    python -m ncpolynomials.testing.testing_evaluation
+"""
+from math import sqrt
+
+import numpy as np
+
+from ncpolynomials.evaluation import Evaluator, expectation
+from ncpolynomials.polynomials import Monomial, Operator
+from ncpolynomials.quantum_utils import generate_measurements
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+chsh = E(0, 0) + E(0, 1) + E(1, 0) - E(1, 1)
+
+# Projectors on the +1 eigenspaces of Z, X and (Z +- X) / sqrt(2)
+I = np.eye(2)
+Z = np.diag([1., -1.])
+X = np.array([[0., 1.], [1., 0.]])
+P = lambda O : (I + O) / 2
+matrices = {A[0][0] : np.kron(P(Z), I), A[1][0] : np.kron(P(X), I),
+            B[0][0] : np.kron(I, P((Z + X) / sqrt(2))), B[1][0] : np.kron(I, P((Z - X) / sqrt(2)))}
+phi = np.array([1., 0., 0., 1.]) / sqrt(2)
+evaluator = Evaluator(matrices)
+value = evaluator.expectation(chsh, states = phi)
+assert abs(value - 2 * sqrt(2)) < 1e-12, value
+assert abs(expectation(chsh, matrices, rho = np.outer(phi, phi)) - 2 * sqrt(2)) < 1e-12
+print('CHSH of the optimal strategy:', value.real)
+
+# A batch of random states against their density matrices, for a list of
+# polynomials
+rng = np.random.RandomState(0)
+psis = rng.randn(7, 4) + 1j * rng.randn(7, 4)
+psis /= np.linalg.norm(psis, axis = 1)[:, None]
+rhos = np.einsum('ni,nj->nij', psis, np.conj(psis))
+polynomials = [chsh, E(0, 0), A[0][0]*B[1][0]*A[1][0], 3 + 0*A[0][0]]
+values = evaluator.expectation(polynomials, states = psis)
+assert values.shape == (4, 7)
+assert np.allclose(values, evaluator.expectation(polynomials, rho = rhos))
+for n in range(7):
+    assert abs(values[0, n] - evaluator.expectation(chsh, states = psis[n])) < 1e-12
+assert np.allclose(values[3], 3)
+
+# Non-Hermitian operator: < Y^dagger Y > = |Y psi|^2 and < Y^dagger > = conj(< Y >)
+Y = Operator('Y', False)
+M = rng.randn(4, 4) + 1j * rng.randn(4, 4)
+evaluator = Evaluator({Y : M})
+values = evaluator.expectation([Y.adj()*Y, Monomial(Y), Monomial(Y.adj())], states = psis)
+assert np.allclose(values[0], np.linalg.norm(np.einsum('ij,nj->ni', M, psis), axis = 1) ** 2)
+assert np.allclose(values[2], np.conj(values[1]))
+try:
+    evaluator.expectation(Monomial(Y), states = psis, rho = rhos)
+    assert False, 'states and rho accepted together'
+except ValueError:
+    pass
+print('Batched states, density matrices and adjoints agree')
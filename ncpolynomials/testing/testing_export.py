@@ -0,0 +1,92 @@
+"""
+Checks of the exports: the SDPA file of the CHSH relaxation at level 1+AB,
+solved by a small reader on top of cvxopt, must give 2 sqrt(2), and the
+sparse maps saved by save_npz must give back the moment matrix. Requires
+numpy, scipy and cvxopt.
+
+    python -m ncpolynomials.testing.testing_export
+"""
+import io
+import os
+import tempfile
+from math import sqrt
+
+import cvxopt
+import numpy as np
+from cvxopt import solvers
+
+from ncpolynomials.export import load_npz, save_npz, sparse_maps, write_sdpa
+from ncpolynomials.quantum_utils import generate_measurements, party_level_monomials, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix
+
+
+def solve_sdpa(text, direction = 'max'):
+    # min c x subject to sum_k F_k x_k - F_0 >= 0, as cvxopt's
+    # sum_k x_k (-F_k) <= -F_0
+    constant = float([line for line in text.splitlines() if line.startswith('* objective constant')][0].split()[3].rstrip(','))
+    lines = [line for line in text.splitlines() if line and line[0] not in '"*']
+    m, n_blocks = int(lines[0]), int(lines[1])
+    sizes = [int(size) for size in lines[2].split()]
+    c = cvxopt.matrix([float(value) for value in lines[3].split()])
+    F = [[cvxopt.matrix(0., (size, size)) for size in sizes] for _ in range(m + 1)]
+    for line in lines[4:]:
+        var, block, i, j, value = line.split()
+        F[int(var)][int(block) - 1][int(i) - 1, int(j) - 1] = float(value)
+        F[int(var)][int(block) - 1][int(j) - 1, int(i) - 1] = float(value)
+    Gs = []
+    for b in range(n_blocks):
+        G = cvxopt.matrix(0., (sizes[b] ** 2, m))
+        for k in range(1, m + 1):
+            G[:, k - 1] = -F[k][b][:]
+        Gs.append(G)
+    solution = solvers.sdp(c, Gs = Gs, hs = [-F[0][b] for b in range(n_blocks)], options = {'show_progress' : False})
+    assert solution['status'] == 'optimal'
+    objective = solution['primal objective']
+    return (-objective if direction == 'max' else objective) + constant
+
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+chsh = E(0, 0) + E(0, 1) + E(1, 0) - E(1, 1)
+mm = MomentMatrix(party_level_monomials([A, B], '1+AB', subs), subs)
+assert len(mm) == 9
+for real in (False, True):
+    f = io.StringIO()
+    variables = write_sdpa(mm, f, chsh, real = real)
+    assert len(variables) == int(f.getvalue().splitlines()[2])
+    value = solve_sdpa(f.getvalue())
+    assert abs(value - 2 * sqrt(2)) < 1e-6, (real, value)
+    f = io.StringIO()
+    write_sdpa(mm, f, chsh, direction = 'min', real = real)
+    value = solve_sdpa(f.getvalue(), 'min')
+    assert abs(value + 2 * sqrt(2)) < 1e-6, (real, value)
+    print('SDPA of CHSH at level 1+AB, real =', real, ':', -value)
+
+# vec(Gamma) = A y + B conj(y), Gamma being Hermitian with the entries of
+# the upper triangle and the real parts of the diagonal entries
+rng = np.random.RandomState(0)
+y = rng.randn(mm.n_moments) + 1j * rng.randn(mm.n_moments)
+y[np.array(mm.real, dtype = bool)] = y[np.array(mm.real, dtype = bool)].real
+n = len(mm)
+gamma = np.zeros((n, n), dtype = complex)
+for i, j, k, c, conj in mm.entries():
+    value = c * (np.conj(y[k]) if conj else y[k])
+    if i == j:
+        gamma[i, i] += value.real
+    else:
+        gamma[i, j] += value
+        gamma[j, i] += np.conj(value)
+A_map, B_map = sparse_maps(mm)
+assert np.allclose(A_map.dot(y) + B_map.dot(np.conj(y)), gamma.flatten(order = 'F'))
+handle, path = tempfile.mkstemp(suffix = '.npz')
+os.close(handle)
+try:
+    save_npz(mm, path)
+    A_loaded, B_loaded, real, size = load_npz(path)
+finally:
+    os.remove(path)
+assert size == n and list(real) == list(mm.real)
+assert abs(A_loaded - A_map).max() == 0 and abs(B_loaded - B_map).max() == 0
+print('Sparse maps of the moment matrix round trip')
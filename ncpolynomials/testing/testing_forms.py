@@ -0,0 +1,64 @@
+"""
+Checks of the MomentForms: the compiled expectation values must match
+MomentMatrix.expectation on solved relaxations, real and complex, and
+evaluate on several solutions at once. Requires numpy, scipy, picos and
+cvxopt.
+
+    python -m ncpolynomials.testing.testing_forms
+"""
+import numpy as np
+
+from ncpolynomials.polynomials import Monomial, Operator
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix
+from ncpolynomials.simplification_utils import flatten, get_all_unique_monomials
+
+
+def check(mm, objective, quantities, real = False):
+    P, y = mm.relaxation(objective, real = real)
+    P.solve(solver = 'cvxopt')
+    forms = mm.compile_polynomials(quantities)
+    assert len(forms) == len(quantities)
+    values = forms.evaluate(y)
+    for q, value in zip(quantities, values):
+        expected = complex(mm.expectation(q, y).value)
+        assert abs(value - expected) < 1e-9, (q, value, expected)
+    return np.asarray(y.value).flatten(), forms
+
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+chsh = E(0, 0) + E(0, 1) + E(1, 0) - E(1, 1)
+mm = MomentMatrix(get_all_unique_monomials(flatten(A + B), 2, subs), subs)
+quantities = [chsh, E(0, 0), A[0][0], A[0][0]*B[1][0]*A[1][0], 2 + 0*A[0][0]]
+for real in (False, True):
+    y, forms = check(mm, chsh, quantities, real)
+    print('CHSH, real =', real, ':', forms.evaluate(y)[0].real)
+
+# Several solutions at once, one per column
+values = forms.evaluate(np.stack([y, 2 * y - np.eye(len(y))[0]], axis = 1))
+assert values.shape == (len(quantities), 2)
+assert np.allclose(values[:, 0], forms.evaluate(y))
+assert np.allclose(values[4], 2)
+
+# Complex moments of non-Hermitian operators
+X = Operator('X', False)
+Y = Operator('Y', False)
+id = Monomial([])
+unitary = {X*X.adj() : id, X.adj()*X : id, Y*Y.adj() : id, Y.adj()*Y : id}
+basis = [id, Monomial(X), Monomial(X.adj()), Monomial(Y), Monomial(Y.adj()), X*Y, Y*X]
+objective = (X*Y + Y.adj()*X.adj()) + (1j*X - 1j*X.adj())
+mm = MomentMatrix(basis, unitary)
+y, forms = check(mm, objective, [objective, Monomial(X), Monomial(X.adj()), 1j*(X*Y), Y.adj()*X.adj()])
+values = forms.evaluate(y)
+assert abs(values[2] - np.conj(values[1])) < 1e-9 and abs(values[4] - np.conj(values[3] / 1j)) < 1e-9
+
+assert forms.moment_matrix.compile_polynomials([]).evaluate(y).shape == (0,)
+try:
+    forms.evaluate(y[:-1])
+    assert False, 'wrong number of moments accepted'
+except ValueError:
+    pass
+print('MomentForms match the expectation values')
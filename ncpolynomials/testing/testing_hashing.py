@@ -0,0 +1,52 @@
+"""
+Checks of the order independent comparison and hashing of polynomials and
+of the constraint deduplication index.
+
+    python -m ncpolynomials.testing.testing_hashing
+"""
+import random
+
+from ncpolynomials.polynomials import Polynomial, PolynomialHash
+from ncpolynomials.simplification_utils import ConstraintIndex, generate_operators, unique_polynomials
+
+X = generate_operators('X', 3, 1)
+terms = [X[0], 2*(X[0]*X[1]), -3*(X[2]*X[1]*X[0]), 0.5*(X[1]*X[1])]
+
+# The same polynomial with its terms in any order, or with like terms split
+random.seed(0)
+p = Polynomial(terms)
+for _ in range(10):
+    random.shuffle(terms)
+    q = Polynomial(terms)
+    assert p == q and hash(p) == hash(q)
+q = Polynomial(terms) + X[0] - X[0] + 1*(X[0]*X[1]) + 1*(X[0]*X[1]) - 2*(X[0]*X[1])
+assert p == q and hash(p) == hash(q)
+assert p != p + X[2] and p != 2*p
+print('Order independent __eq__ and __hash__')
+
+# The running hash matches the hash of the polynomial at every step
+running = PolynomialHash()
+total = Polynomial([])
+for term in terms + [-1*term for term in terms[:2]]:
+    running.add(term.word, term.coef)
+    total = total + term
+    assert running.value() == hash(total)
+assert running.value() == hash(Polynomial(terms[2:]))
+print('PolynomialHash updated term by term')
+
+# Inequalities g >= 0 and -g >= 0 are different constraints, only merged
+# when asked for (equality constraints)
+g = X[0]*X[1] + X[1]*X[0] - 1
+distinct, idx = unique_polynomials([g, 2*g, -1*g, X[1]*X[0] - 1 + X[0]*X[1], g + X[2]])
+assert idx == [0, 0, 1, 0, 2] and len(distinct) == 3, idx
+distinct, idx = unique_polynomials([g, 2*g, -1*g, g + X[2]], positive = False)
+assert idx == [0, 0, 0, 1], idx
+distinct, idx = unique_polynomials([g, 2*g], scalar = False)
+assert idx == [0, 1], idx
+
+index = ConstraintIndex(subs = {X[0]*X[0] : 1})
+assert index.add(X[0]*X[0]*X[1] - X[2]) == (0, True)
+assert index.add(3*(X[1] - X[2])) == (0, False)
+assert X[2] - X[1] not in index
+assert index.counts == [2]
+print('ConstraintIndex: positive multiples merged by default')
@@ -0,0 +1,63 @@
+"""
+Checks of the Hierarchy: at each level its basis must be the one built from
+scratch by get_all_unique_monomials, for closed and non closed substitution
+rules, and its CHSH relaxation must have the value of the MomentMatrix built
+from that basis. The relaxations require picos and cvxopt.
+
+    python -m ncpolynomials.testing.testing_hierarchy
+"""
+from math import sqrt
+
+from ncpolynomials.polynomials import Monomial, Operator
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import Hierarchy, MomentMatrix
+from ncpolynomials.rewriting import compile_rules
+from ncpolynomials.simplification_utils import flatten, get_all_unique_monomials
+from ncpolynomials.words import WordTable
+
+
+def check(base, subs, levels, closed, table = None):
+    letters = set(m.word[0] for m in base)
+    assert compile_rules(subs).is_closed(letters) == closed
+    hierarchy = Hierarchy(base, subs, table = table)
+    for level in range(1, levels + 1):
+        hierarchy.set_level(level)
+        expected = get_all_unique_monomials(base, level, subs)
+        assert [(m.word, m.coef) for m in hierarchy.basis] == [(m.word, m.coef) for m in expected], level
+        # The moments are those of the matrix built from scratch
+        mm = MomentMatrix(expected, subs)
+        assert set(hierarchy.moment_matrix.moments) == set(mm.moments)
+        print('closed =', closed, 'level', level, ':', len(expected), 'monomials')
+    return hierarchy
+
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+base = flatten(A + B)
+check(base, subs, 3, True)
+check(base, subs, 3, True, WordTable())
+
+# X X -> Z introduces a letter outside of the base monomials
+X = Operator('X')
+Y = Operator('Y')
+Z = Operator('Z')
+check([Monomial(X), Monomial(Y)], {X*X : Monomial(Z), Y*Y : Monomial([])}, 4, False)
+check([Monomial(X), Monomial(Y)], {X*X : Monomial(Z), Y*Y : Monomial([])}, 4, False, WordTable())
+
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+chsh = E(0, 0) + E(0, 1) + E(1, 0) - E(1, 1)
+hierarchy = Hierarchy(base, subs)
+for level in (1, 2):
+    hierarchy.set_level(level)
+    P, _ = hierarchy.relaxation(chsh)
+    P.solve(solver = 'cvxopt')
+    Q, _ = MomentMatrix(get_all_unique_monomials(base, level, subs), subs).relaxation(chsh)
+    Q.solve(solver = 'cvxopt')
+    assert abs(P.value - Q.value) < 1e-6 and abs(P.value - 2 * sqrt(2)) < 1e-6, (P.value, Q.value)
+    print('CHSH level', level, ':', P.value)
+try:
+    hierarchy.set_level(1)
+    assert False, 'hierarchy lowered'
+except ValueError:
+    pass
@@ -0,0 +1,60 @@
+"""
+Checks of the localizing matrices: every entry must be the linear form of
+the reduced < m_i^dagger g m_j >, for the default and explicit bases.
+
+    python -m ncpolynomials.testing.testing_localizing
+"""
+from ncpolynomials.polynomials import Monomial, Operator
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix
+from ncpolynomials.simplification_utils import flatten, get_all_unique_monomials
+
+
+def check(mm, L):
+    # Sum the moments of each (i, j) and compare with the linear form
+    forms = {}
+    for i, j, k, c, conj in L.entries():
+        assert i <= j
+        form = forms.setdefault((i, j), {})
+        form[(k, conj)] = form.get((k, conj), 0) + c
+    for i in range(len(L)):
+        for j in range(i, len(L)):
+            expected = mm.linear_form(L.basis[i].adj() * L.polynomial * L.basis[j])
+            expected = dict((key, c) for key, c in expected.items() if abs(c) > 1e-12)
+            found = forms.get((i, j), {})
+            assert set(found) == set(expected), (i, j, found, expected)
+            for key in expected:
+                assert abs(found[key] - expected[key]) < 1e-12, (i, j, key)
+
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+basis = get_all_unique_monomials(flatten(A + B), 2, subs)
+mm = MomentMatrix(basis, subs)
+constraints = [1 - A[0][0], A[0][0]*B[0][0] + B[1][0]*A[1][0] - 0.5, 3*A[1][0] + 2j*A[0][0]*A[1][0] - 2j*A[1][0]*A[0][0]]
+for g, L in zip(constraints, mm.localizing_matrices(constraints)):
+    # The default basis keeps 2 deg(m) + deg(g) within the degree of mm
+    degree = max(len(term) for term in g.terms)
+    assert L.basis == [m for m in basis if 2 * len(m) + degree <= 4]
+    check(mm, L)
+    print('Localizing matrix of size', len(L), 'with', len(L.rows), 'entries')
+
+# Explicit bases may add new moments to the moment matrix
+n_moments = mm.n_moments
+L, = mm.localizing_matrices([constraints[1]], basis = basis)
+assert len(L) == len(basis) and mm.n_moments > n_moments
+check(mm, L)
+
+# Non-Hermitian operators
+X = Operator('X', False)
+id = Monomial([])
+mm = MomentMatrix([id, Monomial(X), Monomial(X.adj())], {X*X.adj() : id})
+for L in mm.localizing_matrices([X + X.adj(), 1j*X - 1j*X.adj() + 2], basis = [id, Monomial(X)]):
+    check(mm, L)
+try:
+    mm.localizing_matrices([Monomial(X) + 0])
+    assert False, 'non-Hermitian constraint accepted'
+except ValueError:
+    pass
+print('Localizing matrices match the linear forms of m_i^dagger g m_j')
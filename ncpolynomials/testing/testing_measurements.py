@@ -0,0 +1,48 @@
+"""
+Checks of the structured projective measurement constraints against the
+dict of rules they stand for.
+
+    python -m ncpolynomials.testing.testing_measurements
+"""
+import pickle
+import random
+
+from ncpolynomials import rewriting
+from ncpolynomials.polynomials import Monomial, Operator
+from ncpolynomials.quantum_utils import MeasurementConstraints, generate_measurements, projective_measurement_constraints
+from ncpolynomials.simplification_utils import flatten, get_all_unique_monomials
+
+A = generate_measurements('A', [3, 2])
+B = generate_measurements('B', [2, 2, 3])
+C = generate_measurements('C', [2])
+subs = projective_measurement_constraints(A, B, C)
+structured = projective_measurement_constraints(A, B, C, structured = True)
+rules = rewriting.RewritingSystem(subs)
+assert len(structured) == len(subs) == len(structured.rules())
+assert sorted(structured.rules()) == sorted(rules.rules())
+
+# Same normal forms on random words, generic operators included, also once
+# pickled as sent to worker processes
+ops = flatten(A + B + C) + [Monomial(Operator('X'))]
+unpickled = pickle.loads(pickle.dumps(structured))
+random.seed(0)
+for _ in range(2000):
+    word = ()
+    for _ in range(random.randint(0, 8)):
+        word = word + random.choice(ops).word
+    expected = rules.reduce(word, 2)
+    assert structured.reduce(word, 2) == expected and unpickled.reduce(word, 2) == expected, word
+for degree in (1, 2, 3):
+    assert [m.word for m in get_all_unique_monomials(ops, degree, subs)] == \
+           [m.word for m in get_all_unique_monomials(ops, degree, structured)]
+print('Structured constraints: same normal forms as the', len(subs), 'rules')
+
+# Further generic rules are applied on top of the structured ones
+extra = {A[0][0]*B[0][0]*A[1][0] : A[1][0]*B[0][0]}
+both = dict(subs)
+both.update(extra)
+combined = MeasurementConstraints([A, B, C], extra)
+assert len(combined) == len(both)
+assert [m.word for m in get_all_unique_monomials(ops, 3, both)] == \
+       [m.word for m in get_all_unique_monomials(ops, 3, combined)]
+print('Structured constraints with generic rules')
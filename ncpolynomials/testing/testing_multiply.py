@@ -0,0 +1,37 @@
+"""
+Checks of the fused multiply and reduce of polynomials against multiplying
+and then simplifying.
+
+    python -m ncpolynomials.testing.testing_multiply
+"""
+import random
+
+from ncpolynomials.polynomials import Monomial, Polynomial
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.simplification_utils import flatten
+
+A = generate_measurements('A', [3, 3])
+B = generate_measurements('B', [3, 3])
+subs = projective_measurement_constraints(A, B)
+ops = flatten(A + B)
+
+def random_polynomial(n_terms):
+    terms = []
+    for _ in range(n_terms):
+        term = Monomial([]) * random.randint(-3, 3)
+        for _ in range(random.randint(0, 3)):
+            term = term * random.choice(ops)
+        terms.append(term)
+    return Polynomial(terms)
+
+random.seed(0)
+for _ in range(50):
+    p, q = random_polynomial(8), random_polynomial(8)
+    expected = (p * q).simplify(subs)
+    assert p.multiply(q, subs) == expected
+    for max_degree in (0, 2, 4):
+        truncated = Polynomial([term for term in expected.terms if term.degree <= max_degree])
+        assert p.multiply(q, subs, max_degree) == truncated
+    assert p.multiply(A[0][0], subs) == (p * A[0][0]).simplify(subs)
+    assert p.multiply(q) == p * q
+print('Polynomial.multiply matches multiplying then simplifying')
@@ -0,0 +1,47 @@
+"""
+Checks of the moment matrix relaxations: CHSH must give 2 sqrt(2) at level
+2, over complex and real matrices, and a relaxation of non-Hermitian
+operators its known optimum. Requires picos and cvxopt.
+
+    python -m ncpolynomials.testing.testing_relaxation
+"""
+from math import sqrt
+
+from ncpolynomials.polynomials import Monomial, Operator
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix
+from ncpolynomials.simplification_utils import flatten, get_all_unique_monomials
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+chsh = E(0, 0) + E(0, 1) + E(1, 0) - E(1, 1)
+basis = get_all_unique_monomials(flatten(A + B), 2, subs)
+
+mm = MomentMatrix(basis, subs)
+# Every entry of the upper triangle is the reduced m_i^dagger m_j
+for i, j, k, c, conj in mm.entries():
+    word, coef = mm.subs.reduce(basis[i].adjword + basis[j].word)
+    assert mm.moments[k] == word and c == coef
+for real in (False, True):
+    P, y = mm.relaxation(chsh, real = real)
+    P.solve(solver = 'cvxopt')
+    assert abs(P.value - 2 * sqrt(2)) < 1e-6, (real, P.value)
+    assert abs(mm.expectation(E(0, 0), y).value.real - 1 / sqrt(2)) < 1e-5
+    print('CHSH, real =', real, ':', P.value)
+
+# Two unitaries: max 2 Re< XY > - 2 Im< X > = 4, whether or not adjoint
+# moments are identified
+X = Operator('X', False)
+Y = Operator('Y', False)
+id = Monomial([])
+unitary = {X*X.adj() : id, X.adj()*X : id, Y*Y.adj() : id, Y.adj()*Y : id}
+basis = [id, Monomial(X), Monomial(X.adj()), Monomial(Y), Monomial(Y.adj()), X*Y, Y*X]
+objective = (X*Y + Y.adj()*X.adj()) + (1j*X - 1j*X.adj())
+for adjoint in (False, True):
+    mm = MomentMatrix(basis, unitary, adjoint = adjoint)
+    P, y = mm.relaxation(objective)
+    P.solve(solver = 'cvxopt')
+    assert abs(P.value - 4) < 1e-6, (adjoint, P.value)
+    print('Unitaries, adjoint =', adjoint, ':', mm.n_moments, 'moments', round(P.value, 6))
@@ -0,0 +1,50 @@
+"""
+Checks of the compiled rewriting of words: the monomial bases of projective
+scenarios, pinned to the output of the original implementation, and the
+reuse of the systems compiled from substitution dicts.
+
+    python -m ncpolynomials.testing.testing_rewriting
+"""
+from hashlib import sha1
+
+from ncpolynomials import rewriting
+from ncpolynomials.polynomials import Monomial
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.simplification_utils import flatten, generate_operators, get_all_unique_monomials
+
+id = Monomial([])
+
+# (io configurations, degree, size, sha1 of the reprs of the basis)
+scenarios = [([[2, 2], [2, 2]], 1, 5, '6fe52a29b7ef0d88d83628a6b26583d50eb2be5a'),
+             ([[2, 2], [2, 2]], 2, 13, 'dcdec3feaf37e81fd33aff4f6d9059190a3cc648'),
+             ([[2, 2], [2, 2]], 3, 25, '29e4d659c66f53dfb017bc93c41d43989c3d84b5'),
+             ([[3, 3], [3, 2]], 2, 32, '8c079f04cd8e6ce4db77585c800e5a164d636a4b'),
+             ([[2, 2], [2, 2], [2, 2]], 2, 25, '41b1b13a34374435d9000c476265a48a6642945d')]
+for configs, degree, size, digest in scenarios:
+    parties = [generate_measurements(chr(ord('A') + k), config) for k, config in enumerate(configs)]
+    basis = get_all_unique_monomials(flatten(parties), degree, projective_measurement_constraints(*parties))
+    assert len(basis) == size, (configs, degree, len(basis))
+    assert sha1('\n'.join(repr(m) for m in basis).encode()).hexdigest() == digest, (configs, degree)
+    print('Basis', configs, 'degree', degree, ':', size, 'monomials')
+
+# Rules are applied leftmost first, iteratively, with their coefficients
+X = generate_operators('X', 3, 1)
+subs = {X[0]*X[1] : 2*(X[1]*X[0]), X[1]*X[1] : id, X[2]*X[2]*X[2] : X[2]}
+assert (X[0]*X[1]*X[1]).simplify(subs) == 4*X[0]
+assert (X[0]*X[0]*X[1]).simplify(subs) == 4*X[1]*X[0]*X[0]
+assert (X[1]*X[0]*X[1]*X[2]).simplify(subs) == 2*X[0]*X[2]
+assert (X[2]*X[2]*X[2]*X[2]*X[2]).simplify(subs) == X[2]
+print('Leftmost iterative rewriting')
+
+# A dict is compiled once while it holds the same rules, and again when it
+# changes
+system = rewriting.compile_rules(subs)
+assert rewriting.compile_rules(subs) is system
+subs[X[2]*X[0]] = X[0]*X[2]
+assert rewriting.compile_rules(subs) is not system
+assert (X[2]*X[0]).simplify(subs) == X[0]*X[2]
+subs[X[2]*X[0]] = 0*id
+assert (X[2]*X[0]).simplify(subs).coef == 0
+del subs[X[2]*X[0]]
+assert (X[2]*X[0]).simplify(subs) == X[2]*X[0]
+print('Compiled systems reused while the dict is unchanged')
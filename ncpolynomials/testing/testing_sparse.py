@@ -0,0 +1,40 @@
+"""
+Checks of SparsePolynomial against Polynomial arithmetic. Requires numpy.
+
+    python -m ncpolynomials.testing.testing_sparse
+"""
+import random
+
+from ncpolynomials.polynomials import Monomial, Polynomial
+from ncpolynomials.simplification_utils import generate_operators
+from ncpolynomials.sparse import SparsePolynomial
+
+X = generate_operators('X', 2, 1)
+Y = generate_operators('Y', 1, 0)
+ops = X + Y + [Monomial(Y[0].terms[0].adj())]
+subs = {X[0]*X[0] : Monomial([]), X[1]*X[0] : X[0]*X[1]}
+
+def random_polynomial(n_terms):
+    terms = []
+    for _ in range(n_terms):
+        term = Monomial([]) * complex(random.randint(-3, 3), random.randint(-1, 1))
+        for _ in range(random.randint(0, 3)):
+            term = term * random.choice(ops)
+        terms.append(term)
+    return Polynomial(terms)
+
+random.seed(0)
+for _ in range(50):
+    p, q = random_polynomial(6), random_polynomial(4)
+    sp, sq = SparsePolynomial.from_polynomial(p), SparsePolynomial.from_polynomial(q)
+    assert (sp + sq).to_polynomial() == p + q
+    assert (sp - sq).to_polynomial() == p - q
+    assert (sp * sq).to_polynomial() == p * q
+    assert (2.5 * sp).to_polynomial() == 2.5 * p and (sp * 0).to_polynomial() == Polynomial([])
+    assert (sp + X[0]).to_polynomial() == p + X[0]
+    assert sp.adj().to_polynomial() == p.adj()
+    assert len(sp) == len(p.canonical())
+    # Polynomial.simplify works in place
+    assert sp.simplify(subs).to_polynomial() == Polynomial(p).simplify(subs)
+    assert (sp - sp).iszero()
+print('SparsePolynomial matches Polynomial on random polynomials')
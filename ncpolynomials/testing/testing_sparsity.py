@@ -0,0 +1,55 @@
+"""
+Checks of the intermediate level bases and of the block structured moment
+matrices of term sparsity. The relaxations require picos and cvxopt.
+
+    python -m ncpolynomials.testing.testing_sparsity
+"""
+from math import sqrt
+
+from ncpolynomials.quantum_utils import generate_measurements, party_level_monomials, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix, term_sparsity_blocks
+from ncpolynomials.simplification_utils import flatten, generate_operators, get_all_unique_monomials
+
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+chsh = E(0, 0) + E(0, 1) + E(1, 0) - E(1, 1)
+
+# Level 1 + AB: the identity, the single projectors and the products A B
+basis = party_level_monomials([A, B], '1+AB', subs)
+assert len(basis) == 1 + 4 + 4, basis
+assert set(m.word for m in party_level_monomials([A, B], '1', subs)) < set(m.word for m in basis)
+assert [m.word for m in party_level_monomials([A, B], '2', subs)] == \
+       [m.word for m in get_all_unique_monomials(flatten(A + B), 2, subs)]
+P, y = MomentMatrix(basis, subs).relaxation(chsh)
+P.solve(solver = 'cvxopt')
+assert abs(P.value - 2 * sqrt(2)) < 1e-6, P.value
+print('CHSH at level 1+AB:', P.value)
+
+# The entries of every block are those of the full matrix within the block
+X = generate_operators('X', 3, 1)
+x_subs = {X[0]*X[0] : 1, X[1]*X[1] : 1, X[2]*X[2] : 1}
+basis = get_all_unique_monomials(X, 2, x_subs)
+objective = X[0]*X[1] + X[1]*X[0] + X[2]
+blocks = term_sparsity_blocks(basis, [objective], x_subs)
+assert len(blocks) > 1, blocks
+full = MomentMatrix(basis, x_subs)
+sparse = MomentMatrix(basis, x_subs, blocks = blocks)
+entries = dict(((i, j), (k, c, conj)) for i, j, k, c, conj in full.entries())
+for b, block in enumerate(blocks):
+    mine = sparse.block_entries(b)
+    expected = [(a, a2) for a, i in enumerate(block) for a2, j in enumerate(block) if a <= a2 and (i, j) in entries]
+    assert sorted(entry[:2] for entry in mine) == expected, b
+    for a, a2, k, c, conj in mine:
+        assert sparse.moments[k] == full.moments[entries[(block[a], block[a2])][0]]
+print('Term sparsity:', len(blocks), 'blocks of sizes', [len(block) for block in blocks])
+
+# Relaxing the blocks only can only increase the maximum
+values = []
+for mm in (full, sparse):
+    P, y = mm.relaxation(objective)
+    P.solve(solver = 'cvxopt')
+    values.append(P.value)
+assert values[1] >= values[0] - 1e-6, values
+print('Full and block relaxations:', values)
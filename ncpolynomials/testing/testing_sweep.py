@@ -0,0 +1,44 @@
+"""
+Checks of Sweep against solving each relaxation through picos. Requires
+picos and cvxopt.
+
+    python -m ncpolynomials.testing.testing_sweep
+"""
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import MomentMatrix, term_sparsity_blocks
+from ncpolynomials.simplification_utils import flatten, generate_operators, get_all_unique_monomials
+from ncpolynomials.sweep import Sweep
+
+
+def picos_value(mm, objective):
+    P, y = mm.relaxation(objective)
+    P.solve(solver = 'cvxopt')
+    return P.value
+
+# Family of CHSH like expressions solved from one compiled relaxation
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+subs = projective_measurement_constraints(A, B)
+E = lambda x, y : (2*A[x][0] - 1) * (2*B[y][0] - 1)
+objectives = [E(0, 0) + E(0, 1) + E(1, 0) - t * E(1, 1) for t in (1, 0.5, 0)]
+mm = MomentMatrix(get_all_unique_monomials(flatten(A + B), 2, subs), subs)
+sweep = Sweep(mm)
+for index, value, status in sweep.run(objectives):
+    assert status == 'optimal', status
+    assert abs(value - picos_value(mm, objectives[index])) < 1e-5, (index, value)
+print('CHSH family:', [round(sweep.solve(objective)[0], 5) for objective in objectives])
+
+# Moment 0 only appears in the 1 x 1 block of the identity, which is dropped
+# as constant, and must still be the variable fixed to 1
+X = generate_operators('X', 2, 1)
+basis = get_all_unique_monomials(X, 1)
+objective = -1*(X[0]*X[0])
+blocks = term_sparsity_blocks(basis, [objective], iterations = 1)
+assert blocks == [[0], [1], [2]], blocks
+mm = MomentMatrix(basis, blocks = blocks)
+sweep = Sweep(mm)
+for offset in (0, 3):
+    value, status = sweep.solve(objective + offset)
+    assert status == 'optimal' and abs(value - offset) < 1e-6, (offset, value, status)
+    assert abs(picos_value(mm, objective + offset) - offset) < 1e-6
+print('Dropped identity block: moment 0 stays fixed to 1')
@@ -0,0 +1,49 @@
+"""
+Checks of the prefix trie WordTable and of the bases, moment matrices and
+hierarchies grown in one.
+
+    python -m ncpolynomials.testing.testing_words
+"""
+from itertools import product
+
+from ncpolynomials.polynomials import adjoint_word
+from ncpolynomials.quantum_utils import generate_measurements, projective_measurement_constraints
+from ncpolynomials.relaxation import Hierarchy, MomentMatrix
+from ncpolynomials.simplification_utils import flatten, generate_operators, get_all_unique_monomials
+from ncpolynomials.words import WordTable
+
+X = generate_operators('X', 3, 1)
+letters = [x.word[0] for x in X]
+table = WordTable()
+words = [word for n in range(4) for word in product(letters, repeat = n)]
+ids = [table.index(word) for word in words]
+assert len(set(ids)) == len(words) == len(table) and table.index(()) == 0
+for word, i in zip(words, ids):
+    assert table.word(i) == word and table.degree(i) == len(word) and table.find(word) == i
+    assert table.adjoint(i) == table.find(adjoint_word(word))
+    assert table.extend(table.find(word[:-1]), word[-1]) == i if word else i == 0
+assert table.find(letters[:1] * 4) is None
+assert table.concat(table.find(letters[:2]), table.find(letters[1:])) == table.find(tuple(letters[:2]) + tuple(letters[1:]))
+prefix = table.find(letters[:1])
+assert sorted(table.with_prefix(prefix, 2)) == sorted(table.find(w) for w in words if w[:1] == tuple(letters[:1]) and len(w) <= 2)
+assert sorted(table.up_to_degree(2)) == sorted(table.find(w) for w in words if len(w) <= 2)
+print('WordTable:', len(table), 'words')
+
+# Bases, moment matrices and hierarchies grown in a table are those built
+# without one
+A = generate_measurements('A', [2, 2])
+B = generate_measurements('B', [2, 2])
+ops = flatten(A + B)
+for subs in (projective_measurement_constraints(A, B), {ops[0]*ops[2]*ops[0] : ops[0]}):
+    table = WordTable()
+    basis = get_all_unique_monomials(ops, 3, subs, table = table)
+    assert [m.word for m in basis] == [m.word for m in get_all_unique_monomials(ops, 3, subs)]
+    assert all(table.find(m.word) is not None for m in basis)
+    mm = MomentMatrix(basis, subs, table = table)
+    assert [table.word(i) for i in mm.word_ids] == mm.moments
+    ids = mm.moments_with_prefix(A[0][0], 3)
+    assert ids == [k for k, word in enumerate(mm.moments) if word[:1] == A[0][0].word and len(word) <= 3]
+    hierarchy = Hierarchy(ops, subs, 3, table = WordTable())
+    assert [m.word for m in hierarchy.basis] == [m.word for m in basis]
+    assert hierarchy.moment_matrix.moments == Hierarchy(ops, subs, 3).moment_matrix.moments
+print('Bases, moments and hierarchies grown in a WordTable')
@@ -0,0 +1,173 @@
+"""
+Interned tables of operator words
+
+A word is the tuple of operator ids making up the product of a Monomial.
+"""
+from array import array
+from . import polynomials as poly
+
+
+class WordTable(object):
+    """
+    WordTable Class
+
+    Description:
+                    Interns words so that each distinct word is identified by
+                    a single integer id. The empty word (identity) always has
+                    id 0. Products and adjoints of interned words are memoized.
+
+                    The words are stored as a prefix trie: each id is a node
+                    holding its last letter and the id of the word without
+                    it, so words sharing a prefix share its storage. Interning
+                    a word interns all of its prefixes, extending a word by a
+                    letter is a single child lookup and words are only
+                    rebuilt as tuples when asked for.
+
+                    Tables are used by SparsePolynomial, and can be passed
+                    to iter_monomials, get_all_unique_monomials, MomentMatrix
+                    and Hierarchy to grow the basis words and intern the
+                    moment words for prefix and degree queries. Monomials and
+                    the moment index keep their tuple words: a trie node
+                    costs more than a short tuple in CPython (about 370MB
+                    against 290MB for the 1.5e6 moment words of a two party
+                    level 4 relaxation), so the table is an index next to the
+                    tuples rather than a replacement for them.
+
+    Attributes:
+                _parent     array of the id of each word without its last letter
+                _letter     array of the last letter of each word
+                _depth      array of the length of each word
+                _children   dict mapping id << 32 | letter to the id of the
+                            extension
+                _first      array of the first child of each node, -1 if none
+                _next       array of the next sibling of each node, -1 if none
+                _products   dict mapping pairs of ids to the id of the product
+                _adjoints   dict mapping ids to the id of the adjoint word
+    """
+
+    # Class constructor
+    def __init__(self):
+        self._parent = array('q', [-1])
+        self._letter = array('q', [-1])
+        self._depth = array('q', [0])
+        self._first = array('q', [-1])
+        self._next = array('q', [-1])
+        self._children = {}
+        self._products = {}
+        self._adjoints = {0 : 0}
+
+    def __len__(self):
+        return len(self._parent)
+
+    def __contains__(self, word):
+        return self.find(word) is not None
+
+    def extend(self, i, letter):
+        """
+        Returns the id of the word with id i followed by letter, adding it to
+        the table if needed
+        """
+        key = i << 32 | letter
+        k = self._children.get(key)
+        if k is None:
+            k = len(self._parent)
+            self._children[key] = k
+            self._parent.append(i)
+            self._letter.append(letter)
+            self._depth.append(self._depth[i] + 1)
+            self._first.append(-1)
+            self._next.append(self._first[i])
+            self._first[i] = k
+        return k
+
+    def find(self, word, i = 0):
+        """
+        Returns the id of the word with id i followed by word, or None if it
+        is not in the table
+        """
+        children = self._children
+        for letter in word:
+            i = children.get(i << 32 | letter)
+            if i is None:
+                return None
+        return i
+
+    def index(self, word, i = 0):
+        """
+        Returns the id of word (appended to the word with id i), adding it to
+        the table if needed
+        """
+        children = self._children
+        for letter in word:
+            k = children.get(i << 32 | letter)
+            i = k if k is not None else self.extend(i, letter)
+        return i
+
+    def indices(self, words):
+        return [self.index(word) for word in words]
+
+    def word(self, i):
+        letters = []
+        parent = self._parent
+        letter = self._letter
+        while i > 0:
+            letters.append(letter[i])
+            i = parent[i]
+        return tuple(reversed(letters))
+
+    def degree(self, i):
+        return self._depth[i]
+
+    def concat(self, i, j):
+        """
+        Returns the id of the product of the words with ids i and j
+        """
+        key = (i, j)
+        k = self._products.get(key)
+        if k is None:
+            k = self.index(self.word(j), i)
+            self._products[key] = k
+        return k
+
+    def adjoint(self, i):
+        """
+        Returns the id of the adjoint of the word with id i
+        """
+        k = self._adjoints.get(i)
+        if k is None:
+            k = self.index(poly.adjoint_word(self.word(i)))
+            self._adjoints[i] = k
+            self._adjoints[k] = i
+        return k
+
+    def with_prefix(self, i, degree = None):
+        """
+        Iterates over the ids of the stored words starting with the word with
+        id i (including itself), of length at most degree if given, depth
+        first
+        """
+        first = self._first
+        next = self._next
+        limit = None if degree is None else degree - self._depth[i]
+        if limit is not None and limit < 0:
+            return
+        stack = [(i, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node
+            if limit is not None and depth == limit:
+                continue
+            child = first[node]
+            while child != -1:
+                stack.append((child, depth + 1))
+                child = next[child]
+
+    def up_to_degree(self, degree):
+        """
+        Iterates over the ids of the stored words of length at most degree
+        """
+        return self.with_prefix(0, degree)
+
+
+# Table shared by objects that do not specify their own
+word_table = WordTable()